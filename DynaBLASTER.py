@@ -6,92 +6,179 @@
    Date: 08/07/15
 """
 
-from tkinter import PhotoImage, Tk, Canvas, Label, StringVar, IntVar, Frame
-from time import clock
-from random import randint
-from PIL import Image, ImageTk
-
-import json
-
-
-ITEMS = ('+bombs', '+power')
+from time import perf_counter
+STARTED = perf_counter() #before the other imports, to time the whole start-up
+
+from tkinter import Tk, Canvas, Label, StringVar, IntVar, Frame
+from assets import SPRITES, sprite
+from render import RenderLayer
+from animation import Animator
+from scheduler import FixedTimestep
+from tilemap import HARD_TILE, SOFT_TILE
+from engine import Game, BOMB, TICK, TILE, SOFT_BLOCK_DENSITY
+from controls import InputQueue, load_bindings
+from bots import load_bot
+from replay import Replay, Recorder
+from mapgen import MapLibrary
+import snapshot
+from viewport import Viewport
+from profiler import Profiler, FrameOverlay
+
+import argparse
+import sys
+
+
+LOOP_TIME = 5 #ms between frames
+WALK_FRAMES = (1, 0, 2, 0) #sprites of a step, shown for WALK_TIME ms each
+WALK_TIME = 133 #ms
+DEATH_FRAMES = (0, 1, 0, 1, 0, 1, 0, 1, 2, 3, 4, 5, 6, 7) #three flaps then falls
+BOMB_FRAMES = (1, 0, 1, 2) #a bomb throbbing
+NUM_SKINS = 2 #sets of player sprites, shared round by larger games
+#canvas item pools from the bottom of the board up, with the items each starts with
+POOLS = (('hardblock', 1), ('softblock', 1), ('item', 8), ('bomb', 16), ('fire', 64))
 
 
 class Graphics(object):
-    def __init__(self, canvas, rows, cols, size, window):
-        '''initialises the graphics object and its properties'''
+    def __init__(self, canvas, game, size, window, view=None):
+        '''initialises the graphics object and its properties, view is the
+           number of cols and rows of the map the canvas shows at once'''
         self.canvas = canvas
+        self.render = RenderLayer(canvas)
+        self.animations = Animator(self.render)
         self.window = window
-        self.rows = rows*2+1
-        self.cols = cols*2+1
+        self.game = game
+        self.rows = game.rows+2
+        self.cols = game.cols+2
         self.size = size/2
         self.label = {}
         self.label_vars = {}
-        self.icons = (ImageTk.PhotoImage(file='png/faceicon0.png'),
-                      ImageTk.PhotoImage(file='png/faceicon1.png'))
+        self.rocks = {}
+        self.absolute = {}
+        self.view = Viewport(game.cols, game.rows, *(view or (game.cols, game.rows)))
+        self.scroll = None
+        self.end_round_frame = None
+        self.icons = (sprite('png/faceicon0.png'), sprite('png/faceicon1.png'))
         self.draw_static_grid()
-        self.draw_changing_grid()
+        for kind, size in POOLS:
+            self.render.pool(kind, size)
+        self.follow()
         self.info_labels()
         self.make_creator_label()
+        game.observers.append(self)
 
     def make_creator_label(self):
         self.canvas.create_text(self.cols*self.size/2+self.size/2,
                                 self.rows*self.size+self.size*2/3+2,
                                 text='Created by Abel Svoboda, 08/07/15')
 
+    def cell_centre(self, col, row):
+        '''returns the centre of a cell on the canvas'''
+        return (col+2)*self.size, (row+2)*self.size
+
+    def to_canvas(self, x, y):
+        '''converts a position in the game to a point on the canvas'''
+        scale = self.size/TILE
+        return x*scale+2*self.size, y*scale+2*self.size
+
     def draw_static_grid(self):
-        '''draws the grid that is made at the start of the game'''
-        hardblock = PhotoImage(file='gifs/hardblock.gif')
-        label = Label(image=hardblock)
-        label.image = hardblock #keeping a reference
-        self.regular = {}
-        self.absolute = {}
-        for col in range(self.cols):
-            for row in range(self.rows):
-                left = col * self.size
-                right = left + self.size+.5*self.size
-                top = row * self.size
-                bot = top + self.size+.5*self.size
-                left += .5*self.size
-                top += .5*self.size
-
-                if row%2==0 and col%2==0 or \
-                   row==0 or col==0 or \
-                   row==self.rows-1 or col==self.cols-1: #hardblock
-                    self.absolute[(col-1,row-1)] = self.canvas.create_image(
-                        (left+right)/2,(top+bot)/2,image=hardblock)
-                else: #walkable
-                    self.regular[(col-1,row-1)] = self.canvas.create_rectangle(
-                        left,top,right,bot,fill='#307100',width=0)
+        '''draws the floor of the map, its blocks are drawn as they come into view'''
+        width = (self.cols+1)*self.size
+        height = (self.rows+1)*self.size
+        self.canvas.configure(scrollregion=(0, 0, width, height))
+        left, top = self.cell_centre(-0.5, -0.5)
+        right, bot = self.cell_centre(self.game.cols-0.5, self.game.rows-0.5)
+        self.floor = self.canvas.create_rectangle(left,top,right,bot,
+                                                  fill='#307100',width=0)
 
     def draw_changing_grid(self):
-        '''draws the grid that is made at the start of each round'''
-        softblock = PhotoImage(file='gifs/softblock.gif')
-        label = Label(image=softblock)
-        label.image = softblock #keeping a reference
-        self.rocks = {}
-        for col in range(self.cols):
-            for row in range(self.rows):
-                left = col * self.size
-                right = left + self.size+.5*self.size
-                top = row * self.size
-                bot = top + self.size+.5*self.size
-                left += .5*self.size
-                top += .5*self.size
-
-                if (row==1 or row==2) and (col==1 or col==2) or \
-                   (row==self.rows-2 or row==self.rows-3) and (col==self.cols-2 or col==self.cols-3) or \
-                   row%2==0 and col%2==0 or \
-                   row==0 or col==0 or row==self.rows-1 or col==self.cols-1:
-                    pass
-                elif randint(0,100) < 50: #soft block density
-                    self.rocks[(col-1,row-1)] = self.canvas.create_image(
-                        (left+right)/2,(top+bot)/2,image=softblock)
+        '''draws the soft blocks in view at the start of each round'''
+        for cell in list(self.rocks):
+            self.release_rock(cell)
+        tiles = self.game.tiles
+        for col, row in self.view.cells():
+            if tiles.get(col, row) & SOFT_TILE:
+                self.show_cell(col, row)
+
+    def show_cell(self, col, row):
+        '''creates the block that stands on a cell that came into view'''
+        tile = self.game.tiles.get(col, row)
+        if tile & HARD_TILE:
+            self.absolute[(col,row)] = self.render.pool('hardblock').acquire(
+                *self.cell_centre(col, row), sprite('gifs/hardblock.gif'))
+        elif tile & SOFT_TILE:
+            self.rocks[(col,row)] = self.render.pool('softblock').acquire(
+                *self.cell_centre(col, row), sprite('gifs/softblock.gif'))
+
+    def hide_cell(self, cell):
+        '''hides the block on a cell that went out of view'''
+        if cell in self.absolute:
+            self.render.pool('hardblock').release(self.absolute.pop(cell))
+        elif cell in self.rocks:
+            self.release_rock(cell)
+
+    def release_rock(self, cell):
+        '''gives the item of a soft block back to its pool'''
+        self.animations.stop(cell)
+        self.render.pool('softblock').release(self.rocks.pop(cell))
+
+    def follow(self):
+        '''moves the camera to the players still standing, or to our own
+           player when they are too far apart to share the view, and
+           materialises the cells that came into view'''
+        players = self.game.alive_players() or self.game.players
+        xs = [player.x/TILE for player in players]
+        ys = [player.y/TILE for player in players]
+        if max(xs)-min(xs) < self.view.width-3 and max(ys)-min(ys) < self.view.height-3:
+            x, y = sum(xs)/len(xs), sum(ys)/len(ys)
+        else:
+            player = self.game.players[getattr(self.game, 'local', 0)]
+            x, y = player.x/TILE, player.y/TILE
+        scroll = self.view.follow(x, y)
+        if scroll != self.scroll:
+            self.scroll = scroll
+            self.canvas.xview_moveto((scroll[0]+2)/(self.cols+1))
+            self.canvas.yview_moveto((scroll[1]+2)/(self.rows+1))
+        added, removed = self.view.update()
+        for cell in removed:
+            self.hide_cell(cell)
+        for cell in added:
+            self.show_cell(*cell)
+
+    def on_rock_removed(self, cell):
+        '''removes a soft block once it has been destroyed'''
+        if cell in self.rocks:
+            self.release_rock(cell)
+
+    def on_round_ended(self, winner):
+        '''updates the score and shows the end of round kill screen'''
+        if winner is not None:
+            self.label_vars['player'+str(winner.player_number)].set(winner.points)
+            string = 'wins!'
+        else:
+            string = 'Draw'
+        self.end_round_kill_screen(self.canvas, string, winner)
+
+    def on_new_round(self):
+        '''redraws the board for a new round'''
+        self.kill_end_round_screen()
+        self.draw_changing_grid()
+        self.follow()
+
+    def on_restored(self):
+        '''redraws the board and the scores of a restored game'''
+        self.kill_end_round_screen()
+        for player in self.game.players:
+            self.label_vars['player'+str(player.player_number)].set(player.points)
+        if self.game.round_over:
+            self.on_round_ended(self.game.winner)
+        self.draw_changing_grid()
+        self.follow()
 
     def info_labels(self):
         '''creates some labels on the UI'''
         self.time_var = StringVar()
         self.time_var.set(0)
+        self.time_text = '0' #what time_var holds, without asking Tcl
         time_label = Label(self.window,textvariable=self.time_var,
                            fg='white', bg='black',
                            font=('DINPro-Black',20), width=8)
@@ -108,21 +195,26 @@ class Graphics(object):
             self.pause_label.grid(row=0,column=2)
 
     def end_round_kill_screen(self, canvas, string, player):
-        '''creates the end of round kill screen'''
-        self.end_round_frame = Frame(self.window, background='#AF0000',bd=4)
+        '''shows the end of round kill screen, made once and reused every round'''
+        if self.end_round_frame is None:
+            self.end_round_frame = Frame(self.window, background='#AF0000',bd=4)
+            self.winner_image = Label(self.end_round_frame, borderwidth=18)
+            self.end_kill_label = Label(self.end_round_frame,
+                                        font=('DINPro-Black',25),borderwidth=9)
+            self.end_kill_label.grid(row=0, column=1)
         self.end_round_frame.grid(row=1, column=0, columnspan=6)
         if player is not None:
-            winner_image = Label(self.end_round_frame,
-                                 image=self.icons[player.player_number-1],
-                                 borderwidth=18)
-            winner_image.grid(row=0, column=0)
-        end_kill_label=Label(self.end_round_frame, text=string+' ',
-                             font=('DINPro-Black',25),borderwidth=9)
-        end_kill_label.grid(row=0, column=1)
+            self.winner_image.configure(
+                image=self.icons[(player.player_number-1) % NUM_SKINS])
+            self.winner_image.grid(row=0, column=0)
+        else:
+            self.winner_image.grid_forget()
+        self.end_kill_label.configure(text=string+' ')
 
     def kill_end_round_screen(self):
         '''removes the end of round screen'''
-        self.end_round_frame.grid_forget()
+        if self.end_round_frame is not None:
+            self.end_round_frame.grid_forget()
 
     def create_player_score(self, player_num):
         '''creates a score counter for a player'''
@@ -131,7 +223,7 @@ class Graphics(object):
         self.label_vars[string] = IntVar()
         self.label_vars[string].set(0)
         self.label[string] = []
-        self.label[string].append(Label(self.window, image=self.icons[player_num]))
+        self.label[string].append(Label(self.window, image=self.icons[player_num % NUM_SKINS]))
         self.label[string][0].grid(row=0,column=col,sticky='e')
         self.label[string][0].configure(background='black')
         self.label[string].append(col)
@@ -150,602 +242,410 @@ class Graphics(object):
         button.columnconfigure(10,weight=9)
 
 
-class Board(object):
-    def __init__(self, canvas, size, num_rows, num_cols, c_width, c_height):
-        '''Initialises the board and its attributes'''
-        self.canvas = canvas
-        self.size = size
-        self.c_width = c_width
-        self.c_height = c_height
-        self.num_rows = num_rows
-        self.num_cols = num_cols
-        self.create_board()
-
-    def create_board(self):
-        '''draws the lines that the player/s use for movement'''
-        self.hor_lines = []
-        for i in range(self.num_rows):
-            y = i*self.size
-            y+=self.size
-            line = self.canvas.create_line(0,y,self.c_width,y)
-            self.canvas.itemconfig(line, state='hidden')
-            self.hor_lines.append(line)
-        self.ver_lines = []
-        for i in range(self.num_cols):
-            x = i*self.size
-            x+=self.size
-            line = self.canvas.create_line(x,0,x,self.c_height)
-            self.canvas.itemconfig(line, state='hidden')
-            self.ver_lines.append(line)
-
-
 class Player(object):
     items = {}
     bombs = {}
     players = []
-    def __init__(self, canvas, board, width, graphics, col, row):
-        '''Initialises the player and its attributes'''
+    def __init__(self, canvas, width, graphics, game, bot=None):
+        '''Initialises the player and its attributes, bot plays it in place
+           of the keyboard when given'''
         self.canvas = canvas
-        self.start_col = col
-        self.start_row = row
+        self.render = graphics.render
+        self.animations = graphics.animations
+        self.game = game
+        self.state = game.players[len(self.players)]
         self.players.append(self)
-        self.player_number = len(self.players)
-        self.board = board
+        self.player_number = self.state.player_number
         self.graphics = graphics
         self.width = width
         self.player_size = width/5
-        self.direction = 'up'
-        self.v_vector = [0,0]
-        self.key_pressed=False
+        self.keys = 0 #key bits held this tick, set from the input queue
+        self.bot = bot
+        if bot is not None:
+            bot.reset(game, self.state)
         self.rocks_dict = graphics.rocks
-        self.regular_dict = graphics.regular
-        self.absolute_dict = graphics.absolute
-        self.pause=False
-        self.round_ended=False
-        self.paused_time = 0
-        self.round_time = 0
-        self.dead = False
-        self.afters = []
-        self.points = 0
+        self.walking = None #direction the walk is animated in
         self.fire = {}
-        self.fire_counter = 0
-        for i in ITEMS:
-            Player.items[i]={}
-        self.power = 2
-        self.num_bombs = 1
-        self.bombs_placed = 0
-        self.time = 0
-        #bomb images
-        self.bombdrop0 = ImageTk.PhotoImage(file='png/bombdrop0.png')
-        self.bomb_images = [ImageTk.PhotoImage(file='png/bombdrop0.png'),
-                            ImageTk.PhotoImage(file='png/bombdrop1.png'),
-                            ImageTk.PhotoImage(file='png/bombdrop2.png')]
-        #player images
-        self.positions = ['forw','back','right','left']
-        self.position = None#'forw'
-        self.player_images = {}
-
-        for position in self.positions:
-            images_of_position = []
-            for i in range(3):
-                images_of_position.append(ImageTk.PhotoImage(
-                    file='png/'+str(self.player_number)+position+str(i)+'.png'))
-            self.player_images[position] = images_of_position
-        #dead images
-        self.death_images = []
-        for i in range(8):
-            self.death_images.append(ImageTk.PhotoImage(
-                file='png/'+str(self.player_number)+'dead'+str(i)+'.png'))
-        #soft block images
-        self.soft_block_images = []
-        for i in range(1,6):
-            self.soft_block_images.append(
-                ImageTk.PhotoImage(file='png/softblock'+str(i)+'.png'))
-        #fire images
-        self.fire_images={}
-        fire_text = ['hor','vert','mid','top','bot','left','right']
-        for text in fire_text:
-            self.fire_images[text]=[]
-            num_images=4
-            if text == 'mid':
-                num_images=5
-            for num in range(num_images):
-                self.fire_images[text].append(
-                    ImageTk.PhotoImage(file='fire/'+text+str(num)+'.png'))
         #scoreboard
         self.graphics.create_player_score(self.players.index(self))
-        #images
-        self.images = {}
-        for i in ITEMS:
-            self.images[i]=[]
-            self.images[i].append(PhotoImage(file='gifs/'+i+'0.gif'))
-            self.images[i].append(PhotoImage(file='gifs/'+i+'1.gif'))
-
-        hobo = ImageTk.PhotoImage(file='png/'+str(self.player_number)+'forw0.png')
-        l = Label(image=hobo)
-        l.image = hobo # keep a reference! doesnt work without
-        left, top, right, bot = self.canvas.coords(self.regular_dict[(col,row)])
-
-        self.player = self.canvas.create_rectangle(
-            left, top, right, bot, fill='white')
-        self.canvas.itemconfig(self.player, state='hidden')
-        self.player_image = self.canvas.create_image(
-            (left+right)/2,(top+bot)/2-4, image=self.player_images['forw'][0])
-
-        self.animate_player()
-        self.movement()
-
-    def key_press(self, key):
-        '''functionality for key press of movement keys'''
-        if key == 'Up':
-            self.v_vector = [0,-1]
-            self.position = 'back'
-        elif key == 'Down':
-            self.v_vector = [0,1]
-            self.position = 'forw'
-        elif key == 'Left':
-            self.v_vector = [-1,0]
-            self.position = 'left'
-        elif key == 'Right':
-            self.v_vector = [1,0]
-            self.position = 'right'
-
-    def key_release(self, key):
-        '''functionality for key realease of movement keys'''
-        if key == 'Up':
-            self.v_vector[1] = 0
-            self.position = None
-        elif key == 'Down':
-            self.v_vector[1] = 0
-            self.position = None
-        elif key == 'Left':
-            self.v_vector[0] = 0
-            self.position = None
-        elif key == 'Right':
-            self.v_vector[0] = 0
-            self.position = None
-
-    def animate_player(self,position='forw',x=0,num=0):
-        '''animates the player'''
-        if self.position is not None:
-            position = self.position
-            num = [0,1,0,2][int(x)]
-            x+=0.075
-            if int(x)==4:
-                x=0
-        else:
-            num=0
-            x=0.999
-        if not self.dead and not self.round_ended:
-            self.canvas.itemconfig(self.player_image,image=self.player_images[position][num])
-            self.after(10,lambda:self.animate_player(position,x))
-
-    def after(self, time, function, num_loops=-1):
-        '''like the canvas.after method but incorporates pause functionality'''
-        loop_time = 5 #ms
-        if num_loops == -1:
-            num_loops = time // loop_time
-        if num_loops == 0:
-            function()# Call it
-            return
-        if not self.pause:
-            num_loops -= 1
-            new_time = time-loop_time
-        else:
-            new_time = time
-        self.canvas.after(loop_time, self.after, new_time, function, num_loops)
-
-    def place_bomb(self, event):
-        '''places a bomb when a key is pressed if conditions are met'''
-        if self.bombs_placed < self.num_bombs and not self.round_ended and not self.dead and not self.pause:
-            col = self.row_col[0]
-            row = self.row_col[1]
-            if (col,row) not in self.bombs:
-                left, top, right, bot = self.canvas.coords(
-                    self.regular_dict[(col,row)])
-                bomb = self.canvas.create_image(
-                    (left+right)/2,(top+bot)/2,image=self.bombdrop0)
-                self.bombs[(col,row)]=bomb
-                self.animate_bomb(col,row)
-                self.bombs_placed += 1
-        elif self.round_ended:
-            self.end_round()
-            self.graphics.kill_end_round_screen()
-
-    def animate_bomb(self, col, row, counter=0, bomb_num=1, reverse=True):
-        '''animates a bomb'''
-        if (col,row) not in self.bombs or self.round_ended:
+
+        self.player_image = self.render.create_image(
+            0, 0, image=sprite(self.sprite_path('forw0')))
+        self.remember()
+        self.draw()
+        game.observers.append(self)
+        self.draw_owned() #when joining a round midway
+
+    def draw_owned(self):
+        '''draws the bombs, items and fire of this player already on the board'''
+        for bomb in self.game.bombs.values():
+            self.on_bomb_placed(bomb)
+        for item in self.game.items.values():
+            self.on_item_dropped(item)
+        for fire in self.game.fires:
+            self.on_fire_created(fire)
+
+    def sprite_path(self, name):
+        '''returns the path of one of this player's sprites'''
+        return 'png/'+str((self.player_number-1) % NUM_SKINS + 1)+name+'.png'
+
+    def get_input(self):
+        '''returns the key bits the game reads for this player this tick'''
+        if self.bot is not None:
+            return self.bot.keys(self.game, self.state)
+        return self.keys
+
+    def remember(self):
+        '''keeps the player's position before a step, to draw it between steps'''
+        self.last_position = self.state.x, self.state.y
+
+    def draw(self, alpha=1):
+        '''moves the player image to the player's position in the game,
+           alpha of the way from where it was before the last step'''
+        x, y = self.state.x, self.state.y
+        last_x, last_y = self.last_position
+        if abs(x-last_x) + abs(y-last_y) < TILE: #not put back on its spawn
+            x = last_x + (x-last_x)*alpha
+            y = last_y + (y-last_y)*alpha
+        x, y = self.graphics.to_canvas(x, y)
+        self.render.move_to(self.player_image, x, y-self.graphics.size/8)
+        self.walk()
+
+    def walk(self):
+        '''animates the player walking the way it is heading, or standing
+           facing the way it last walked'''
+        state = self.state
+        if state.position == self.walking or state.dead or self.game.round_over:
             return
-        elif counter < 2700:
-            self.canvas.itemconfig(self.bombs[(col,row)],
-                                   image=self.bomb_images[bomb_num])
-            counter += 210
-            if reverse:
-                bomb_num -= 1
-                if bomb_num==0:
-                    reverse = False
-            else:
-                bomb_num += 1
-                if bomb_num==2:
-                    reverse = True
-            self.after(210, lambda:self.animate_bomb(col,row,counter,
-                                                     bomb_num,reverse))
+        self.walking = state.position
+        if state.position is None:
+            self.animations.stop(self)
+            self.render.configure(self.player_image,
+                                  image=sprite(self.sprite_path(state.facing+'0')))
         else:
-            self.destroy_blocks(col,row)
-
-    def destroy_blocks(self, col, row):
-        '''determines where fire should go and what it will affect'''
-        for player in self.players:
-            if player.round_ended:
-                return
-        if (col,row) in self.bombs:
-            self.canvas.delete(self.bombs[(col,row)])
-            del self.bombs[(col,row)]
-            self.bombs_placed -= 1
-            fire_counter = self.fire_counter
-            self.fire_counter += 1
-            self.destroy_blocks_per_side(col, row, 1, 0, 'right', 'hor',fire_counter)
-            self.destroy_blocks_per_side(col, row, -1, 0, 'left', 'hor',fire_counter)
-            self.destroy_blocks_per_side(col, row, 0, 1, 'bot', 'vert',fire_counter)
-            self.destroy_blocks_per_side(col, row, 0, -1, 'top', 'vert',fire_counter)
-            self.after(500, lambda:self.remove_fire(fire_counter))
-
-    def destroy_blocks_per_side(self, col, row, d1, d2, end, side, fire_counter):
-        '''determines where fire should go and what it will affect for a specific direction'''
-        left, top, right, bot = self.canvas.coords(self.regular_dict[(col,row)])
-        if fire_counter not in self.fire:
-            self.fire[fire_counter] = []
-        self.create_fire(fire_counter, 'mid', col, row)
-        for i in range(1,self.power+1):
-            if (col+i*d1,row+i*d2) in self.absolute_dict:#if fire touches a hard block
-                break
-            if (col+i*d1,row+i*d2) in self.bombs:#if fire touches another bomb
-                self.destroy_blocks(col+i*d1,row+i*d2)
-            for p in Player.items:
-                if (col+i*d1,row+i*d2) in Player.items[p]:#if fire touches an item
-                    self.use_item(p,(col+i*d1,row+i*d2),False)
-            if i==self.power:
-                side = end
-            if (col+i*d1,row+i*d2) in self.rocks_dict:
-                self.delete_rocks(col+i*d1,row+i*d2)
-                break
-            self.create_fire(fire_counter, side, col+i*d1,row+i*d2)
-
-    def create_fire(self, fire_counter, image_type, col, row):
-        '''creates a specific fire at a specific location'''
-        left, top, right, bot = self.canvas.coords(self.regular_dict[(col,row)])
-        self.fire[fire_counter].append(self.canvas.create_image(
-            (left+right)/2,(top+bot)/2,image=self.fire_images[image_type][0]))
-        list_num = len(self.fire[fire_counter])-1
-        for player in self.players:
-            if (col,row) == player.row_col:#if fire touches the player
-                player.die()
-        self.after(125,lambda:self.animate_fire(
-            fire_counter, image_type, list_num, col, row))
-
-    def animate_fire(self, fire_counter, image_type, list_num, col, row, counter=0):
-        '''animates the fire'''
-        if counter < 4:
-            for player in self.players:
-                if (col,row) == player.row_col:#if fire touches the player
-                    player.die()
-            self.canvas.itemconfig(self.fire[fire_counter][list_num],
-                                   image=self.fire_images[image_type][counter])
-            self.after(125,lambda:self.animate_fire(
-                fire_counter,image_type, list_num, col, row, counter+1))
-
-    def remove_fire(self, fire_counter):
+            frames = tuple(sprite(self.sprite_path(state.position+str(num)))
+                           for num in WALK_FRAMES)
+            self.animations.play(self, self.player_image, frames, WALK_TIME, loop=True)
+
+    def on_bomb_placed(self, bomb):
+        '''draws a bomb this player placed'''
+        if bomb.owner is self.state:
+            self.bombs[bomb] = self.render.pool('bomb').acquire(
+                *self.graphics.cell_centre(bomb.col, bomb.row), sprite('png/bombdrop0.png'))
+            frames = tuple(sprite('png/bombdrop'+str(num)+'.png') for num in BOMB_FRAMES)
+            self.animations.play(bomb, self.bombs[bomb], frames, 210, loop=True)
+
+    def on_bomb_exploded(self, bomb):
+        '''removes the image of a bomb that went off'''
+        if bomb in self.bombs:
+            self.animations.stop(bomb)
+            self.render.pool('bomb').release(self.bombs.pop(bomb))
+
+    def on_fire_created(self, fire):
+        '''draws the fire of a bomb this player placed'''
+        if fire.owner is self.state:
+            pool = self.render.pool('fire')
+            self.fire[fire] = [pool.acquire(*self.graphics.cell_centre(col, row),
+                                            sprite('fire/'+image_type+'0.png'))
+                               for col, row, image_type in fire.cells]
+            for i, (col, row, image_type) in enumerate(fire.cells):
+                frames = tuple(sprite('fire/'+image_type+str(num)+'.png')
+                               for num in range(4))
+                self.animations.play((fire, i), self.fire[fire][i], frames, 125,
+                                     delay=125)
+
+    def on_fire_removed(self, fire):
         '''removes the fire from a specific bomb'''
-        for i in self.fire[fire_counter]:
-            self.canvas.delete(i)
-        del self.fire[fire_counter]
+        if fire in self.fire:
+            pool = self.render.pool('fire')
+            for i, item in enumerate(self.fire.pop(fire)):
+                self.animations.stop((fire, i))
+                pool.release(item)
 
-    def die(self):
+    def on_player_died(self, player):
         '''handles the death of the player'''
-        if not self.dead:
-            self.dead = True
-            self.after(50, self.animate_death)
-            num_alive = 0
-            for player in self.players:
-                if not player.dead:
-                    num_alive += 1
-            if num_alive < 2:
-                num_dead = False
-                for player in self.players:
-                    if player.dead:
-                        num_dead += 1
-                if num_dead < 2:
-                    self.after(3000, self.end_round_screen)
-
-    def end_round_screen(self):
-        '''determines data used for the end of round kill screen'''
-        alive = None
-        for player in self.players:
-            if not player.dead:
-                alive = player
-
-        if alive is not None:
-            alive.points += 1
-            self.graphics.label_vars['player'+str(alive.player_number)].set(alive.points)
-            string = 'wins!'
-        else:
-            string = 'Draw'
-
-        for player in self.players:
-            player.round_ended = True
-        self.graphics.end_round_kill_screen(self.canvas,string,alive)
-
-    def animate_death(self, count=0, num_flaps=3):
-        '''animates the player on death'''
-        if count == 2 and num_flaps > 0:
-            count = 0
-            num_flaps -= 1
-        if count < 8:
-            self.canvas.itemconfig(self.player_image,image=self.death_images[count])
-            self.after(130, lambda:self.animate_death(count+1, num_flaps))
-        else:
-            self.canvas.itemconfig(self.player_image,state='hidden')
-
-    def end_round(self):
-        '''resets the round to play a new round'''
-        for i in self.bombs:
-            self.canvas.delete(self.bombs[i])
-        self.bombs = {}
-        for i in Player.items:
-            for item in Player.items[i]:
-                self.canvas.delete(Player.items[i][item])
-        Player.items={}
-
-        for i in ITEMS:
-            Player.items[i]={}
-
-        for i in self.rocks_dict:
-            self.canvas.delete(self.rocks_dict[i])
-        self.graphics.draw_changing_grid()
-
-        for player in self.players:
-            player.rocks_dict = self.graphics.rocks
-            left, top, right, bot = player.canvas.coords(
-                player.regular_dict[(player.start_col,player.start_row)])
-            player.canvas.coords(player.player, left, top, right, bot)
-            player.canvas.coords(player.player_image, (left+right)/2,(top+bot)/2-4)
-
-            player.canvas.itemconfig(player.player_image,state='normal')
-            player.canvas.itemconfig(player.player_image,
-                                     image=self.player_images['forw'][0])
-            player.dead=False
-            player.canvas.tag_raise(player.player_image)
-            player.round_ended = False
-            player.bombs_placed = 0
-            player.num_bombs = 1
-            player.power = 2
-            player.animate_player()
-            player.movement()
-            player.round_time = clock()
-            player.paused_time = 0
-
-    def drop_item(self, col, row):
-        '''creates an item'''
-        length = len(ITEMS)
-        chance = randint(0,99)
-        segment = 100/length
-        for i in range(length):
-            if chance >= i*segment and chance < (i+1)*segment:
-                item_name = ITEMS[i]
-        left, top, right, bot = self.canvas.coords(self.regular_dict[(col,row)])
-
-        item = self.canvas.create_image((left+right)/2,(top+bot)/2,image=self.images[item_name][0])
-        Player.items[item_name][(col,row)]=item
-        self.animate_item(col,row,item_name)
-
-    def use_item(self, item, col_row, use=True):
-        '''removes the item, gaining properties if necessary'''
-        if item=='+power':
-            self.canvas.delete(Player.items['+power'][(col_row)])
-            del Player.items['+power'][(col_row)]
-            if use:
-                self.power += 1
-        elif item=='+bombs':
-            self.canvas.delete(Player.items['+bombs'][(col_row)])
-            del Player.items['+bombs'][(col_row)]
-            if use:
-                self.num_bombs += 1
-
-    def delete_rocks(self, col, row):
-        '''destroys the rock and does other necessary things
-        related to block destruction, e.g. item drops.'''
-        self.animate_soft_block_death(col, row)
-        chance = randint(0,99)
-        if chance <= 25:
-            self.drop_item(col, row)
-
-    def animate_soft_block_death(self, col, row, counter=0):
-        '''animates the destruction of a soft block'''
-        try:
-            if counter < 5:
-                self.canvas.itemconfig(self.rocks_dict[(col,row)], image=self.soft_block_images[counter])
-                self.after(120,lambda:self.animate_soft_block_death(col, row, counter+1))
-            else:
-                self.canvas.delete(self.rocks_dict[(col,row)])
-                del self.rocks_dict[(col,row)]
-        except IndexError:
-            pass
-        except KeyError:
-            pass
-
-    def get_row_col(self, ver_line_num, hor_line_num):
-        '''returns the current column and row of the player'''
-        return round(ver_line_num*2), round(hor_line_num*2)
-
-    def animate_item(self, col, row, item, count=0):
-        '''animates the item'''
+        if player is self.state:
+            frames = tuple(sprite(self.sprite_path('dead'+str(num))) for num in DEATH_FRAMES)
+            self.animations.play(self, self.player_image, frames, 130, delay=50,
+                                 on_done=self.on_death_animated)
+
+    def on_death_animated(self):
+        '''hides the player once it has finished dying'''
+        self.render.configure(self.player_image, state='hidden')
+
+    def on_new_round(self):
+        '''resets the drawing of the player for a new round'''
+        for bomb in list(self.bombs):
+            self.on_bomb_exploded(bomb)
+        for item in list(Player.items):
+            self.on_item_removed(item, None)
+        for fire in list(self.fire):
+            self.on_fire_removed(fire)
+        self.reset_image()
+
+    def on_restored(self):
+        '''redraws the player and what it owns once the game was restored'''
+        for bomb in [bomb for bomb in self.bombs if bomb.owner is self.state]:
+            self.on_bomb_exploded(bomb)
+        for item in [item for item in Player.items if item.owner is self.state]:
+            self.on_item_removed(item, None)
+        for fire in list(self.fire):
+            self.on_fire_removed(fire)
+        self.reset_image()
+        self.draw_owned()
+
+    def reset_image(self):
+        '''puts the player image where the player stands, as it stands'''
+        if self.bot is not None:
+            self.bot.reset(self.game, self.state)
+        self.animations.stop(self)
+        self.walking = None
+        self.remember()
+        self.draw()
+        self.render.configure(self.player_image,
+                              state='hidden' if self.state.dead else 'normal',
+                              image=sprite(self.sprite_path(self.state.facing+'0')))
+        self.render.tag_raise(self.player_image)
+
+    def on_round_ended(self, winner):
+        '''stops the player walking on the spot once the round is over'''
+        if not self.state.dead:
+            self.animations.stop(self)
+
+    def on_item_dropped(self, item):
+        '''draws an item dropped by a soft block this player destroyed'''
+        if item.owner is self.state:
+            Player.items[item] = self.render.pool('item').acquire(
+                *self.graphics.cell_centre(item.col, item.row),
+                sprite('gifs/'+item.name+'0.gif'))
+            frames = tuple(sprite('gifs/'+item.name+str(num)+'.gif') for num in range(2))
+            self.animations.play(item, Player.items[item], frames, 240, loop=True)
+
+    def on_item_removed(self, item, player):
+        '''removes the image of an item that was picked up or burnt'''
         if item in Player.items:
-            if (col,row) in Player.items[item]:
-                if count > 1:
-                    count = 0
-                self.canvas.itemconfig(Player.items[item][(col,row)],image=self.images[item][count])
-                self.after(240, lambda:self.animate_item(col, row, item, count+1))
-
-    def movement(self):
-        '''handles the movement of the player'''
-
-        if self.v_vector == [0,-1]:
-            self.position = 'back'
-        elif self.v_vector == [0,1]:
-            self.position = 'forw'
-        elif self.v_vector == [-1,0]:
-            self.position = 'left'
-        elif self.v_vector == [1,0]:
-            self.position = 'right'
-
-        self.centre = self.get_centre()
-
-        #near vertical line
-        near_ver_line, ver_line_num = self.near_line(0)
-        if not near_ver_line:
-            self.v_vector[1] = 0
-        #near horizontal line
-        near_hor_line, hor_line_num = self.near_line(1)
-        if not near_hor_line:
-            self.v_vector[0] = 0
-
-        self.row_col = self.get_row_col(ver_line_num,hor_line_num)
-
-        self.stop_player(ver_line_num, 0) #stop player at top/bot boundaries
-        self.stop_player(hor_line_num, 1) #stop player at left/right boundaries
-
-        #picking up item
-        for i in Player.items:
-            if self.row_col in Player.items[i]:
-                self.use_item(i, self.row_col)
-
-        #stops player when meeting a soft block
-        self.stop_player_at_tile(self.rocks_dict, ver_line_num, hor_line_num)
-        #stops player when meeting a bomb
-        self.stop_player_at_tile(self.bombs, ver_line_num, hor_line_num)
-
-        #gets player to the centre of the horizontal line
-        if near_hor_line:
-            self.get_player_to_middle(self.board.hor_lines, round(hor_line_num), 1)
-        #gets player to the centre of the horizontal line
-        if near_ver_line:
-            self.get_player_to_middle(self.board.ver_lines, round(ver_line_num), 0)
-
-        if not self.dead and not self.round_ended:
-            self.move(self.v_vector[0], self.v_vector[1])
-            self.after(round(1000/60), self.movement)
+            self.animations.stop(item)
+            self.render.pool('item').release(Player.items.pop(item))
+
+    def on_rock_destroyed(self, cell, owner):
+        '''animates a soft block this player destroyed'''
+        if owner is self.state and cell in self.rocks_dict:
+            frames = tuple(sprite('png/softblock'+str(num)+'.png') for num in range(1, 6))
+            self.animations.play(cell, self.rocks_dict[cell], frames, 120)
 
     def clock(self):
         '''determines the value on the clock'''
-        self.time_value = clock() - self.paused_time - self.round_time
+        self.time_value = self.game.time/1000
         second = int(self.time_value % 60)
         if second < 10:
             second = '0'+str(second)
         minute = round(self.time_value//60)
         time = '{}:{}'.format(minute, second)
-        self.graphics.time_var.set(time)
-
-    def move(self, x, y):
-        '''moves the player on the x-y axis'''
-        x*=2
-        y*=2
-        self.canvas.move(self.player, x, y)
-        self.canvas.move(self.player_image, x, y)
-
-    def stop_player(self, line_num, dimension):
-        '''stops the player at the boundaries and other blockades'''
-        if dimension == 0:
-            row_col = self.board.num_cols-1
-        elif dimension == 1:
-            row_col = self.board.num_rows-1
-        #stop player at left/top boundary
-        if line_num <= 0:
-            if self.v_vector[dimension] < 0:
-                self.v_vector[dimension] = 0
-        #stop player at right/bot boundary
-        if line_num >= row_col:
-            if self.v_vector[dimension] > 0:
-                self.v_vector[dimension] = 0
-
-    def stop_player_at_tile(self, tile_type, ver_line_num, hor_line_num):
-        '''stops the player at tile types'''
-        col = self.row_col[0]
-        row = self.row_col[1]
-        if self.v_vector[0]<0:
-            if (col-1,row) in tile_type:
-                if ver_line_num*2 <= col:
-                    self.v_vector[0] = 0
-        elif self.v_vector[0]>0:
-            if (col+1,row) in tile_type:
-                if ver_line_num*2 >= col:
-                    self.v_vector[0] = 0
-        elif self.v_vector[1] < 0:
-            if (col,row-1) in tile_type:
-                if hor_line_num*2 <= row:
-                    self.v_vector[1] = 0
-        elif self.v_vector[1] > 0:
-            if (col,row+1) in tile_type:
-                if hor_line_num*2 >= row:
-                    self.v_vector[1] = 0
-
-    def near_line(self, dimension):
-        '''returns a boolean whether the player is near a line
-           returns the line number of said line'''
-        near_line = False
-        size = self.board.size
-        line_num = self.centre[dimension] / size - 1
-        if round(line_num) - line_num > -0.4 and round(line_num) - line_num < 0.4:
-            near_line = True
-        return near_line, line_num
-
-    def get_player_to_middle(self, lines, line_num, d1):
-        '''gets player to the centre of the column or row'''
-        d2 = abs(d1-1)
-        if self.v_vector[d2] != 0:
-            dif_to_line = self.centre[d1] - self.canvas.coords(lines[line_num])[d1]
-            if dif_to_line < 0:
-                self.move(d2, d1)
-            elif dif_to_line > 0:
-                self.move(-d2, -d1)
-
-    def get_centre(self):
-        '''returns the position of the player on the canvas'''
-        left, top, right, bot = self.canvas.coords(self.player)
-        centre = [(left+right)/2, (top+bot)/2]
-        return centre
-
-    def pause_game(self, event=0):
-        '''pauses/unpauses the functionalities of the player'''
-        if self.pause:
-            self.pause = False
-            self.paused_time += clock() - self.pause_time
-        else:
-            self.pause = True
-            self.pause_time = clock()
+        if self.graphics.time_text != time:
+            self.graphics.time_text = time
+            self.graphics.time_var.set(time)
 
 
-def pause_game(player1, player2, graphics):
-    '''pauses/unpauses the functionalities of the game'''
-    dead=False
-    for player in player1.players:
-        if player.dead:
-            dead=True
-    if not dead:
+def pause_game(graphics, timestep):
+    '''pauses/unpauses the game, until the round is decided'''
+    game = graphics.game
+    if not game.round_over and game.end_time is None:
         graphics.pause_game()
-        player1.pause_game()
-        player2.pause_game()
-
-def key_release_of(key):
-    key_val = key.strip()[1:-1]   # Strip angle brackets
-    return "<KeyRelease-" + key_val + ">"
+        timestep.paused = not timestep.paused
+
+def save_game(game, path):
+    '''writes a snapshot of the game to path'''
+    with open(path, 'wb') as snapshot_file:
+        snapshot_file.write(snapshot.save(game))
+
+def load_game(game, path):
+    '''puts the game back in the state saved at path, if there is one'''
+    try:
+        with open(path, 'rb') as snapshot_file:
+            data = snapshot_file.read()
+    except FileNotFoundError:
+        return
+    snapshot.restore(game, data)
+
+def simulate(game, players, inputs=None, controls=None):
+    '''advances the game by one tick, reading the keys held this tick from
+       controls, an input queue and the players its slots control; inputs
+       replays recorded keys in place of the keyboard'''
+    for player in players:
+        player.remember()
+    if controls is not None:
+        queue, controlled = controls
+        held, pressed = queue.drain()
+        for player, keys in zip(controlled, held):
+            player.keys = keys
+        if game.round_over and any(keys & BOMB for keys in pressed):
+            game.new_round() #rematch
+            return
+    if inputs is None:
+        game.step([player.get_input() for player in players], TICK)
+    else:
+        keys = next(inputs, None)
+        if keys is not None:
+            game.step(keys, TICK)
+
+def draw_frame(graphics, players, alpha):
+    '''draws the players alpha of the way between the last two ticks'''
+    graphics.follow()
+    for player in players:
+        player.draw(alpha)
+    players[0].clock()
+    graphics.render.flush()
+
+def game_loop(canvas, game, graphics, players, timestep, inputs=None, speed=1,
+              controls=None):
+    '''the single Tk callback: runs the animations and ticks due by the
+       monotonic clock, speed times faster for replays, then draws a frame'''
+    if timestep.paused:
+        timestep.reset()
+    else:
+        steps = timestep.advance(speed)
+        graphics.animations.advance(steps*TICK) #in step with the simulation
+        for i in range(steps):
+            simulate(game, players, inputs, controls)
+    draw_frame(graphics, players, timestep.alpha)
+    canvas.after(LOOP_TIME, game_loop, canvas, game, graphics, players,
+                 timestep, inputs, speed, controls)
+
+def startup_report():
+    '''returns a line describing how long the program took to show its first
+       frame and where the sprites it drew came from'''
+    stats = SPRITES.stats()
+    return ('first frame after {:.0f} ms: {} sprites, {} from the bundle, '
+            '{:.0f} ms decoding, PIL {}'.format(
+                (perf_counter()-STARTED)*1000, stats['images'], stats['bundled'],
+                stats['decode_time']*1000,
+                'imported' if 'PIL' in sys.modules else 'not imported'))
+
+def soak_game(window, game, graphics, players, rounds, every=1):
+    '''plays rounds with bots as fast as they go, drawing every tick, and
+       reports what piles up from round to round; returns whether anything
+       kept growing'''
+    from soak import Soak, MAX_ROUND_TIME #pulls in tournament and multiprocessing
+    canvas = graphics.canvas
+    render = graphics.render
+    soak = Soak({
+        'canvas items': lambda: len(canvas.find_all()) - sum(
+            pool.size for pool in render.pools.values()), #pools only grow to their peak
+        'pooled in use': lambda: sum(render.pools[kind].in_use
+                                     for kind in ('item', 'bomb', 'fire')),
+        'Tk callbacks': lambda: len(window.tk.splitlist(window.tk.call('after', 'info'))),
+        'timers': game.pending,
+        'animations': lambda: len(graphics.animations),
+        'sprites held': lambda: len(Player.bombs) + len(Player.items) +
+                                sum(len(player.fire) for player in players)})
+    soak.start()
+    for i in range(rounds):
+        while not game.round_over and game.time < MAX_ROUND_TIME:
+            simulate(game, players)
+            graphics.animations.advance(TICK)
+            draw_frame(graphics, players, 1)
+            window.update()
+        game.new_round()
+        draw_frame(graphics, players, 1)
+        window.update()
+        soak.sample()
+        if soak.rounds % every == 0:
+            print(soak.line())
+    soak.stop()
+    print('\n'.join(soak.report()))
+    return bool(soak.growing())
 
 def main():
     '''runs the program'''
-    square_width = 64
-    num_cols = 7
-    num_rows = 6
-    canvas_width = (num_cols+1)*square_width
-    canvas_height = (num_rows+1)*square_width
+    parser = argparse.ArgumentParser(description='A Python clone of Bomberman')
+    parser.add_argument('--connect', metavar='HOST:PORT',
+                        help='join a game served by netplay.py instead of playing locally')
+    parser.add_argument('--record', metavar='PATH',
+                        help='save a replay of every round, {round} in PATH is '
+                             'replaced by the round number')
+    parser.add_argument('--replay', metavar='PATH', help='watch a recorded round')
+    parser.add_argument('--broadcast', type=int, metavar='PORT',
+                        help='let spectators watch the game with --watch')
+    parser.add_argument('--watch', metavar='HOST:PORT',
+                        help='watch a game broadcast with --broadcast')
+    parser.add_argument('--speed', type=float, default=1,
+                        help='how many times faster than real time to play a replay')
+    parser.add_argument('--start', type=int, default=0, metavar='TICK',
+                        help='tick of a replay to start watching from')
+    parser.add_argument('--cols', type=int, default=7,
+                        help='lanes across the map, which is 2*COLS-1 cells wide')
+    parser.add_argument('--rows', type=int, default=6,
+                        help='lanes down the map, which is 2*ROWS-1 cells high')
+    parser.add_argument('--players', type=int, default=2,
+                        help='players in a local game, those without keys in '
+                             'bindings.json are bots')
+    parser.add_argument('--bot', default='random',
+                        help='bot playing the players without keys, a name from '
+                             'bots.BOTS or module:Class')
+    parser.add_argument('--profile', metavar='TRACE',
+                        help='time the main subsystems every frame, show a frame '
+                             'time histogram and write a Chrome trace to TRACE on exit')
+    parser.add_argument('--view', default='13x11', metavar='COLSxROWS',
+                        help='cells of the map shown at once, the camera '
+                             'follows the players across larger maps')
+    parser.add_argument('--snapshot', default='snapshot.dbs', metavar='PATH',
+                        help='where the Save key saves the game and Load loads it from')
+    parser.add_argument('--resume', action='store_true',
+                        help='carry on the game saved in the snapshot')
+    parser.add_argument('--scale', type=float, default=1,
+                        help='size of the board, its sprites are resampled '
+                             'once per scale and cached on disk')
+    parser.add_argument('--maps', metavar='DIR',
+                        help='play each round on a vetted map from the library '
+                             'in DIR, building it first when it has none of this size')
+    parser.add_argument('--density', type=float, default=SOFT_BLOCK_DENSITY,
+                        help='soft block density of the maps from --maps')
+    parser.add_argument('--soak', type=int, metavar='ROUNDS',
+                        help='let bots play ROUNDS rounds flat out, reporting memory, '
+                             'canvas items and pending callbacks after each, and '
+                             'exit with 1 if any of them keeps growing')
+    parser.add_argument('--startup', action='store_true',
+                        help='print how long the first frame took to show, then quit')
+    args = parser.parse_args()
+
+    square_width = round(64*args.scale)
+    SPRITES.scale = args.scale
+    if args.connect:
+        from netplay import connect #only network games need asyncio
+        host, port = args.connect.rsplit(':', 1)
+        game = connect(host, int(port))
+    elif args.watch:
+        from spectate import watch
+        host, port = args.watch.rsplit(':', 1)
+        game = watch(host, int(port))
+    elif args.replay:
+        replay = Replay.load(args.replay)
+        if args.start:
+            replay.build_keyframes()
+        game, inputs = replay.start(args.start)
+    elif args.resume:
+        with open(args.snapshot, 'rb') as snapshot_file:
+            game = snapshot.load(snapshot_file.read())
+        if args.maps: #for the rounds after the saved one
+            game.maps = MapLibrary(args.maps).maps(
+                game.num_cols, game.num_rows, len(game.players), args.density)
+    else:
+        maps = None
+        if args.maps:
+            maps = MapLibrary(args.maps).maps(args.cols, args.rows, args.players,
+                                              args.density)
+        game = Game(args.cols, args.rows, args.players, maps=maps)
+    if args.record:
+        Recorder(game, args.record)
+    if args.broadcast:
+        from spectate import Broadcaster
+        broadcaster = Broadcaster(game)
+        broadcaster.attach()
+        broadcaster.start('0.0.0.0', args.broadcast)
+    view_cols, view_rows = (int(i) for i in args.view.lower().split('x'))
+    view = min(view_cols, game.cols), min(view_rows, game.rows)
+    canvas_width = (view[0]+3)*square_width/2
+    canvas_height = (view[1]+3)*square_width/2
 
     window = Tk()
     window.configure(background='black')
@@ -758,43 +658,65 @@ def main():
                     height=canvas_height, background='#717171')
     canvas.grid(row=1,column=0, columnspan=5)
 
-    graphics = Graphics(canvas, num_rows, num_cols, square_width, window)
-    board = Board(canvas, square_width, num_rows, num_cols,
-                  canvas_width, canvas_height)
-    col=0
-    row=0
-    player1 = Player(canvas, board, square_width, graphics, col, row)
-    col = graphics.cols - 3
-    row = graphics.rows - 3
-    player2 = Player(canvas, board, square_width, graphics, col, row)
-
-    # Import settings from bindings file
-    bindings_file = open('bindings.json')
-    p1_bindings, p2_bindings, gen_bindings = json.load(bindings_file)
-
-    window.bind(key_release_of(p1_bindings["Up"]), lambda event:player1.key_release('Up'))
-    window.bind(key_release_of(p1_bindings["Down"]), lambda event:player1.key_release('Down'))
-    window.bind(key_release_of(p1_bindings["Left"]), lambda event:player1.key_release('Left'))
-    window.bind(key_release_of(p1_bindings["Right"]), lambda event:player1.key_release('Right'))
-    window.bind(p1_bindings["Up"], lambda event:player1.key_press('Up'))
-    window.bind(p1_bindings["Down"],lambda event:player1.key_press('Down'))
-    window.bind(p1_bindings["Left"], lambda event:player1.key_press('Left'))
-    window.bind(p1_bindings["Right"], lambda event:player1.key_press('Right'))
-    window.bind(p1_bindings["Bomb"], player1.place_bomb)
-
-    window.bind(key_release_of(p2_bindings["Up"]), lambda event:player2.key_release('Up'))
-    window.bind(key_release_of(p2_bindings["Down"]), lambda event:player2.key_release('Down'))
-    window.bind(key_release_of(p2_bindings["Left"]), lambda event:player2.key_release('Left'))
-    window.bind(key_release_of(p2_bindings["Right"]), lambda event:player2.key_release('Right'))
-    window.bind(p2_bindings["Up"], lambda event:player2.key_press('Up'))
-    window.bind(p2_bindings["Down"], lambda event:player2.key_press('Down'))
-    window.bind(p2_bindings["Left"], lambda event:player2.key_press('Left'))
-    window.bind(p2_bindings["Right"], lambda event:player2.key_press('Right'))
-    window.bind(p2_bindings["Bomb"], player2.place_bomb)
-
-    window.bind(gen_bindings["Pause"], lambda event:pause_game(player1, player2, graphics))
-
+    graphics = Graphics(canvas, game, square_width, window, view)
+    player_bindings, general_bindings = load_bindings()
+    queue = InputQueue(player_bindings, general_bindings)
+    local = not args.connect and not args.watch and not args.replay
+    players = []
+    for i in range(len(game.players)):
+        bot = None
+        if (i >= len(player_bindings) or args.soak) and local:
+            bot = load_bot(args.bot)('{}-{}'.format(game.seed, i))
+        players.append(Player(canvas, square_width, graphics, game, bot))
+    controlled = list(players) #the player each slot of the bindings controls
+    if args.connect: #the first keys control our own player
+        controlled.insert(0, controlled.pop(game.local))
+    elif args.watch:
+        controlled = []
+    timestep = FixedTimestep(TICK)
+    queue.handlers['Pause'] = lambda: pause_game(graphics, timestep)
+    if local:
+        queue.handlers['Save'] = lambda: save_game(game, args.snapshot)
+        queue.handlers['Load'] = lambda: load_game(game, args.snapshot)
+    queue.bind(window)
+
+    if args.profile:
+        profiler = Profiler()
+        profiler.instrument_game(game)
+        profiler.instrument(graphics, 'follow', 'camera')
+        profiler.instrument(graphics.render, 'flush', 'render')
+        profiler.mark_frames(graphics.render, 'flush')
+        profiler.instrument(graphics.animations, 'advance', 'animations')
+        profiler.watch('timers', game.pending)
+        profiler.watch('animations running', lambda: len(graphics.animations))
+        FrameOverlay(canvas, profiler)
+
+    if args.soak and local:
+        sys.exit(1 if soak_game(window, game, graphics, players, args.soak) else 0)
+
+    controls = (queue, controlled)
+    if args.replay:
+        game_loop(canvas, game, graphics, players, timestep, inputs, args.speed,
+                  controls)
+    else:
+        game_loop(canvas, game, graphics, players, timestep, controls=controls)
+    window.update() #puts the first frame on screen
+    startup = startup_report()
+    if args.startup:
+        print(startup)
+        window.destroy()
+        return
     window.mainloop()
-
-
-main()
+    if args.profile:
+        profiler.export(args.profile)
+        print(startup)
+        print('\n'.join(profiler.summary()))
+        for kind, stats in graphics.render.pool_stats().items():
+            print('{:20} {size:5} items {high_water:5} in use at most'.format(
+                'pool '+kind, **stats))
+        print('{:20} {:5} running at most'.format('animations',
+                                                   graphics.animations.most))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Sprite animations for DynaBLASTER.
+   Every running animation is a row in one table: the canvas item it draws
+   on, its frames, how long each is shown, when the next is due, which one
+   is showing, whether it loops and what to do once it is over. The game loop
+   advances the whole table in one pass, so an animation costs a few list
+   updates per frame rather than a chain of timer callbacks.
+"""
+
+#fields of a row of the table
+ITEM, FRAMES, FRAME_TIME, DUE, INDEX, LOOP, ON_DONE = range(7)
+
+
+class Animator(object):
+    def __init__(self, render):
+        '''initialises an empty table drawing through a RenderLayer'''
+        self.render = render
+        self.active = {} #key -> row
+        self.time = 0 #ms, only moved on by advance
+        self.most = 0 #most animations running at once
+
+    def __len__(self):
+        '''returns the number of animations running'''
+        return len(self.active)
+
+    def play(self, key, item, frames, frame_time, loop=False, delay=0, on_done=None):
+        '''shows frames on item one after another, frame_time ms each,
+           starting after delay ms and replacing whatever animation was
+           playing under key; a finished animation stays on its last frame
+           and calls on_done'''
+        row = [item, frames, frame_time, self.time+delay, -1, loop, on_done]
+        self.active[key] = row
+        if len(self.active) > self.most:
+            self.most = len(self.active)
+        if not delay:
+            self.render.configure(item, image=frames[0])
+            row[DUE] += frame_time
+            row[INDEX] = 0
+
+    def stop(self, key):
+        '''stops the animation playing under key where it is'''
+        self.active.pop(key, None)
+
+    def playing(self, key):
+        '''returns whether an animation is playing under key'''
+        return key in self.active
+
+    def advance(self, time):
+        '''moves the animations on by time ms, returns how many changed frame'''
+        self.time = now = self.time+time
+        configure = self.render.configure
+        finished = []
+        changed = 0
+        for key, row in self.active.items():
+            if row[DUE] > now:
+                continue
+            frames = row[FRAMES]
+            steps = int((now - row[DUE])//row[FRAME_TIME]) + 1
+            row[DUE] += steps*row[FRAME_TIME]
+            index = row[INDEX] + steps
+            if index >= len(frames):
+                if not row[LOOP]:
+                    finished.append(key)
+                    if row[INDEX] == len(frames)-1:
+                        continue
+                    index = len(frames)-1
+                else:
+                    index %= len(frames)
+            row[INDEX] = index
+            configure(row[ITEM], image=frames[index])
+            changed += 1
+        for key in finished:
+            on_done = self.active.pop(key)[ON_DONE]
+            if on_done is not None:
+                on_done()
+        return changed
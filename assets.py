@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+
+"""Process-wide sprite cache for DynaBLASTER.
+   Every image is decoded once, the first time it is asked for, and shared by
+   everything that draws it, so adding players does not add decoding work.
+
+   Sprites drawn at another scale are resampled once and kept on disk, named
+   after a hash of the source image and the scale, so later launches load
+   them ready-made and a changed sprite is resampled again. A whole set can be
+   resampled ahead of time with e.g. python3 assets.py --scale 1.5
+
+   python3 assets.py --bundle packs every sprite, at a scale, into one indexed
+   file of PNG and GIF blobs that Tk decodes by itself. The game maps the
+   bundle into memory at launch and decodes each sprite from it the first time
+   it is drawn, so it opens one file instead of over a hundred and only
+   imports PIL when there is no bundle, or a sprite folder changed since it
+   was written. Launching only looks at the folders, so a sprite edited in
+   place, without being saved anew, needs the bundle written again.
+"""
+
+from tkinter import PhotoImage, TkVersion
+from time import perf_counter
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+import threading
+
+CACHE_DIR = '.sprite_cache'
+SPRITE_DIRS = ('png', 'fire', 'gifs')
+SPRITE_TYPES = ('.png', '.gif')
+BUNDLE_MAGIC = b'DBAB'
+BUNDLE_VERSION = 1
+BUNDLE_HEADER = struct.Struct('<4sBddI') #magic, version, scale, newest
+                                          #sprite's or folder's mtime, sprites
+BUNDLE_ENTRY = struct.Struct('<HII') #length of the path, where its data
+                                     #starts and its length, then the path
+TK_PNG = TkVersion >= 8.6 #Tk decodes PNGs by itself from 8.6 on
+
+
+class SpriteCache(object):
+    def __init__(self, scale=1, cache_dir=CACHE_DIR):
+        '''initialises an empty cache and its counters, sprites being drawn at
+           scale unless asked otherwise'''
+        self.scale = scale
+        self.cache_dir = cache_dir
+        self.images = {}
+        self.digests = {} #path -> hash of the source image
+        self.hits = 0
+        self.misses = 0
+        self.resampled = 0 #images resampled as they were not on disk yet
+        self.bundled = 0 #images decoded from a bundle
+        self.decode_time = 0 #seconds
+        self.bundles = {} #scale -> SpriteBundle, None when there is none
+        self.lock = threading.Lock()
+
+    def get(self, path, scale=None):
+        '''returns the image at path resized by scale, decoding it on first use'''
+        if scale is None:
+            scale = self.scale
+        key = (path, scale)
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+        self.misses += 1
+        start = perf_counter()
+        image = self.load(path, scale)
+        self.decode_time += perf_counter() - start
+        self.images[key] = image
+        return image
+
+    def load(self, path, scale):
+        '''decodes the image at path, resampled to scale, from the bundle
+           when there is one or else from the disk cache'''
+        bundle = self.bundle(scale)
+        if bundle is not None and path in bundle and (TK_PNG or path.endswith('.gif')):
+            self.bundled += 1
+            return PhotoImage(data=bundle.read(path))
+        from PIL import ImageTk #only needed without a bundle
+        if scale == 1:
+            if path.endswith('.gif'):
+                return PhotoImage(file=path)
+            return ImageTk.PhotoImage(file=path)
+        return ImageTk.PhotoImage(file=self.scaled_path(path, scale))
+
+    def scaled_path(self, path, scale):
+        '''returns where the image at path resampled to scale is cached,
+           resampling it first if it is not there yet'''
+        digest = self.digests.get(path)
+        if digest is None:
+            with open(path, 'rb') as source:
+                digest = hashlib.sha1(source.read()).hexdigest()[:20]
+            self.digests[path] = digest
+        cached = os.path.join(self.cache_dir, '{}@{:g}x.png'.format(digest, scale))
+        if not os.path.exists(cached):
+            os.makedirs(self.cache_dir, exist_ok=True)
+            resample(path, scale, cached)
+            with self.lock:
+                self.resampled += 1
+        return cached
+
+    def build(self, scale, dirs=SPRITE_DIRS):
+        '''resamples every sprite in dirs to scale that is not cached yet,
+           several at a time, returns their cached paths'''
+        from concurrent.futures import ThreadPoolExecutor #not worth it at launch
+        paths = sprite_paths(dirs)
+        with ThreadPoolExecutor() as pool: #PIL lets go of the GIL to resample
+            return list(pool.map(self.scaled_path, paths, [scale]*len(paths)))
+
+    def bundle(self, scale):
+        '''returns the bundle of sprites at scale, None when there is none or
+           a sprite folder changed since it was written'''
+        if scale not in self.bundles:
+            bundle = None
+            path = bundle_path(scale, self.cache_dir)
+            if os.path.exists(path):
+                bundle = SpriteBundle(path)
+                if bundle.newest < newest_folder():
+                    bundle.close()
+                    bundle = None
+            self.bundles[scale] = bundle
+        return self.bundles[scale]
+
+    def write_bundle(self, scale, dirs=SPRITE_DIRS):
+        '''packs every sprite in dirs at scale into a bundle, returns where
+           it was written'''
+        paths = sprite_paths(dirs)
+        sources = paths if scale == 1 else self.build(scale, dirs)
+        blobs = []
+        for source in sources:
+            with open(source, 'rb') as sprite_file:
+                blobs.append(sprite_file.read())
+        names = [path.encode() for path in paths]
+        offset = BUNDLE_HEADER.size + sum(BUNDLE_ENTRY.size+len(name) for name in names)
+        parts = [BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, scale,
+                                    max(newest_sprite(dirs), newest_folder(dirs)),
+                                    len(paths))]
+        for name, blob in zip(names, blobs):
+            parts.append(BUNDLE_ENTRY.pack(len(name), offset, len(blob)) + name)
+            offset += len(blob)
+        parts.extend(blobs)
+        path = bundle_path(scale, self.cache_dir)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        partial = path+'.part'
+        with open(partial, 'wb') as bundle_file:
+            bundle_file.write(b''.join(parts))
+        os.replace(partial, path)
+        self.bundles.pop(scale, None)
+        return path
+
+    def stats(self):
+        '''returns the counters of the cache'''
+        return {'images': len(self.images), 'hits': self.hits,
+                'misses': self.misses, 'resampled': self.resampled,
+                'bundled': self.bundled, 'decode_time': self.decode_time}
+
+    def clear(self):
+        '''forgets every decoded image'''
+        self.images.clear()
+
+
+class SpriteBundle(object):
+    def __init__(self, path):
+        '''opens a bundle written by SpriteCache.write_bundle, mapping it
+           into memory and reading its index'''
+        self.path = path
+        with open(path, 'rb') as bundle_file:
+            self.data = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.scale, self.newest, count = \
+            BUNDLE_HEADER.unpack_from(self.data)
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            self.data.close()
+            raise ValueError(path+' is not a version {} sprite bundle'.format(
+                BUNDLE_VERSION))
+        self.entries = {} #path -> where its data starts and its length
+        offset = BUNDLE_HEADER.size
+        for i in range(count):
+            length, start, size = BUNDLE_ENTRY.unpack_from(self.data, offset)
+            offset += BUNDLE_ENTRY.size
+            name = self.data[offset:offset+length].decode().replace('\\', '/')
+            offset += length
+            self.entries[name] = (start, size)
+
+    def __contains__(self, path):
+        '''returns whether the bundle holds the sprite at path'''
+        return path in self.entries
+
+    def __len__(self):
+        '''returns the number of sprites in the bundle'''
+        return len(self.entries)
+
+    def read(self, path):
+        '''returns the data of the sprite at path'''
+        start, size = self.entries[path]
+        return self.data[start:start+size]
+
+    def close(self):
+        '''unmaps the bundle'''
+        self.data.close()
+
+
+def resample(path, scale, destination):
+    '''writes the image at path resized by scale to destination, whole
+       scales keeping the pixels sharp'''
+    from PIL import Image
+    image = Image.open(path).convert('RGBA')
+    size = (max(round(image.width*scale), 1), max(round(image.height*scale), 1))
+    sharp = scale == int(scale)
+    image = image.resize(size, Image.NEAREST if sharp else Image.LANCZOS)
+    partial = destination+'.part'
+    image.save(partial, 'PNG')
+    os.replace(partial, destination) #never leaves half a file behind
+
+
+def sprite_paths(dirs=SPRITE_DIRS):
+    '''returns the path of every sprite in dirs, with forward slashes on
+       every system, as the game names them in the bundle'''
+    return ['/'.join((folder, name)) for folder in dirs
+            for name in sorted(os.listdir(folder))
+            if name.endswith(SPRITE_TYPES)]
+
+
+def newest_sprite(dirs=SPRITE_DIRS):
+    '''returns when a sprite in dirs last changed'''
+    return max(os.path.getmtime(path) for path in sprite_paths(dirs))
+
+
+def newest_folder(dirs=SPRITE_DIRS):
+    '''returns when a sprite was last added to, removed from or saved anew
+       in dirs, from the folders alone'''
+    return max(os.path.getmtime(folder) for folder in dirs)
+
+
+def bundle_path(scale, cache_dir=CACHE_DIR):
+    '''returns where the bundle of sprites at scale is kept'''
+    return os.path.join(cache_dir, 'sprites@{:g}x.bundle'.format(scale))
+
+
+SPRITES = SpriteCache()
+
+
+def sprite(path, scale=None):
+    '''returns the image at path from the shared cache'''
+    return SPRITES.get(path, scale)
+
+
+def main():
+    '''resamples the sprites to a scale from the command line, packing them
+       into a bundle when asked'''
+    parser = argparse.ArgumentParser(description='prepares the sprites ahead of time')
+    parser.add_argument('--scale', type=float, default=1)
+    parser.add_argument('--bundle', action='store_true',
+                        help='pack them into one file the game maps at launch')
+    parser.add_argument('--cache', default=CACHE_DIR, help='where to keep them')
+    args = parser.parse_args()
+    cache = SpriteCache(args.scale, args.cache)
+    start = perf_counter()
+    if args.bundle:
+        path = cache.write_bundle(args.scale)
+        print('{} sprites at {:g}x packed into {} ({} bytes), {} resampled, in {:.2f}s'.format(
+            len(SpriteBundle(path)), args.scale, path, os.path.getsize(path),
+            cache.resampled, perf_counter() - start))
+    elif args.scale == 1:
+        parser.error('nothing to prepare at 1x without --bundle')
+    else:
+        count = len(cache.build(args.scale))
+        print('{} sprites at {:g}x, {} resampled in {:.2f}s'.format(
+            count, args.scale, cache.resampled, perf_counter() - start))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+
+"""Benchmarks for the hot paths of DynaBLASTER.
+   Every benchmark is timed on its own, headless where it can be, and the
+   results are written as JSON and compared against a stored baseline, e.g.
+
+       python3 bench.py --baseline bench_baseline.json
+       python3 bench.py --save bench_baseline.json       record a new baseline
+       xvfb-run python3 bench.py --filter draw            with the Tk ones
+
+   Benchmarks that need a display are skipped when there is none. The exit
+   status is 1 when a benchmark got slower than its baseline by more than
+   --tolerance.
+"""
+
+from engine import Game, TICK, UP, DOWN, LEFT, RIGHT
+from bots import RandomBot, SmartBot
+from time import perf_counter
+
+import argparse
+import fnmatch
+import gc
+import json
+import platform
+import snapshot
+import statistics
+import sys
+
+REPEAT = 20
+BENCHMARKS = [] #(name, function, param)
+
+
+def benchmark(name, *params):
+    '''registers a benchmark, once for each of params'''
+    def register(function):
+        for param in params or (None,):
+            full_name = name if param is None else '{}/{}'.format(name, param)
+            BENCHMARKS.append((full_name, function, param))
+        return function
+    return register
+
+
+def timed(run, setup=None, ops=1, repeat=REPEAT):
+    '''times run(setup()) repeat times, returns the seconds each of its ops took'''
+    samples = []
+    for i in range(repeat):
+        state = setup() if setup is not None else None
+        gc.collect()
+        start = perf_counter()
+        run(state)
+        samples.append((perf_counter() - start)/ops)
+    return samples
+
+
+def open_board(num_cols, num_rows, num_players=2):
+    '''returns a game without soft blocks'''
+    game = Game(num_cols, num_rows, num_players, seed=0)
+    game.tiles.reset()
+    return game
+
+
+@benchmark('move')
+def bench_move(param):
+    '''one tick of two players walking round an open board'''
+    game = open_board(7, 6)
+    pattern = (RIGHT, DOWN, LEFT, UP)
+    ticks = 600
+    def run(state):
+        for tick in range(ticks):
+            keys = pattern[tick//60 % 4]
+            game.step([keys, keys], TICK)
+    return timed(run, ops=ticks)
+
+
+@benchmark('chain', 16, 64, 256, 1024)
+def bench_chain(num_bombs):
+    '''setting off a chain reaction of num_bombs bombs'''
+    size = int(num_bombs**0.5)+1
+    def setup():
+        game = open_board(size, size)
+        player = game.players[0]
+        player.num_bombs = num_bombs
+        player.power = 2
+        for i in range(num_bombs):
+            player.col, player.row = divmod(i, size)
+            player.col *= 2
+            player.row *= 2
+            game.place_bomb(player)
+        return game
+    def run(game):
+        game.detonate([next(iter(game.bombs.values()))])
+    return timed(run, setup)
+
+
+@benchmark('new_round', 7, 15, 31, 63)
+def bench_new_round(size):
+    '''generating the soft blocks of a size x size board and listing them'''
+    game = Game(size, size, seed=0)
+    def run(state):
+        game.new_round()
+        game.rocks()
+    return timed(run)
+
+
+@benchmark('end_round')
+def bench_end_round(param):
+    '''ending a round on a busy board and resetting it for the next'''
+    def setup():
+        game = Game(seed=0)
+        for player in game.players:
+            game.place_bomb(player)
+        return game
+    def run(game):
+        game.end_round()
+        game.new_round()
+    return timed(run, setup)
+
+
+@benchmark('timer', 1000, 10000)
+def bench_timer(num_timers):
+    '''a bomb fusing, going off and its fire burning out, the engine's timers,
+       with num_timers bombs waiting'''
+    size = int(num_timers**0.5)+1
+    def setup():
+        game = open_board(size, size)
+        player = game.players[0]
+        player.num_bombs = num_timers
+        player.power = 1 #the fire stops short of the next bomb
+        for i in range(num_timers):
+            player.col, player.row = divmod(i, size)
+            player.col *= 2
+            player.row *= 2
+            game.place_bomb(player)
+        return game
+    def run(game):
+        while game.bombs or game.fires:
+            game.step([0, 0], TICK)
+    return timed(run, setup, ops=num_timers, repeat=5)
+
+
+@benchmark('round')
+def bench_round(param):
+    '''a whole tick of a round between two random bots, end to end'''
+    def setup():
+        game = Game(seed=0)
+        pairs = [(RandomBot(i), player) for i, player in enumerate(game.players)]
+        return game, pairs
+    def run(state):
+        game, pairs = state
+        for tick in range(1200):
+            if game.tick == 0:
+                for bot, player in pairs:
+                    bot.reset(game, player)
+            if game.round_over:
+                game.new_round()
+            game.step([bot.keys(game, player) for bot, player in pairs], TICK)
+    return timed(run, setup, ops=1200)
+
+
+@benchmark('crowd', 2, 8, 16)
+def bench_crowd(num_players):
+    '''a whole tick of a round between num_players random bots on a big map'''
+    def setup():
+        game = Game(15, 15, num_players, seed=0)
+        pairs = [(RandomBot(i), player) for i, player in enumerate(game.players)]
+        for bot, player in pairs:
+            bot.reset(game, player)
+        return game, pairs
+    def run(state):
+        game, pairs = state
+        for tick in range(600):
+            game.step([bot.keys(game, player) for bot, player in pairs], TICK)
+    return timed(run, setup, ops=600, repeat=5)
+
+
+@benchmark('smart', 4, 16)
+def bench_smart(num_bots):
+    '''a whole tick of a round between num_bots smart bots on a big map'''
+    def setup():
+        game = Game(15, 15, num_bots, seed=0)
+        pairs = [(SmartBot(i), player) for i, player in enumerate(game.players)]
+        for bot, player in pairs:
+            bot.reset(game, player)
+        return game, pairs
+    def run(state):
+        game, pairs = state
+        for tick in range(600):
+            game.step([bot.keys(game, player) for bot, player in pairs], TICK)
+    return timed(run, setup, ops=600, repeat=5)
+
+
+@benchmark('snapshot', 7, 31)
+def bench_snapshot(size):
+    '''saving and restoring a snapshot of a size x size round halfway through'''
+    game = Game(size, size, 4, seed=0)
+    pairs = [(RandomBot(i), player) for i, player in enumerate(game.players)]
+    for bot, player in pairs:
+        bot.reset(game, player)
+    for tick in range(300):
+        game.step([bot.keys(game, player) for bot, player in pairs], TICK)
+    def run(state):
+        for i in range(100):
+            snapshot.restore(game, snapshot.save(game))
+    return timed(run, ops=100)
+
+
+def open_window():
+    '''returns a Tk window, or None when there is no display'''
+    try:
+        from tkinter import Tk, TclError
+        return Tk()
+    except (ImportError, TclError):
+        return None
+
+
+@benchmark('draw_changing_grid', 7, 15, 31)
+def bench_draw_changing_grid(size):
+    '''redrawing the soft blocks of a size x size board on a Canvas'''
+    window = open_window()
+    if window is None:
+        return None
+    from tkinter import Canvas
+    from DynaBLASTER import Graphics
+    try:
+        game = Game(size, size, seed=0)
+        canvas = Canvas(window, width=(size+1)*64, height=(size+1)*64)
+        graphics = Graphics(canvas, game, 64, window)
+        def run(state):
+            game.new_round()
+            graphics.draw_changing_grid()
+            window.update_idletasks()
+        return timed(run, repeat=5)
+    finally:
+        window.destroy()
+
+
+def run_benchmarks(pattern='*'):
+    '''runs every benchmark matching pattern, returns their results'''
+    results = {}
+    for name, function, param in BENCHMARKS:
+        if not fnmatch.fnmatch(name, pattern):
+            continue
+        samples = function(param)
+        if samples is None:
+            print('{:28} skipped, no display'.format(name), file=sys.stderr)
+            continue
+        results[name] = {'median_us': statistics.median(samples)*1e6,
+                         'min_us': min(samples)*1e6,
+                         'repeat': len(samples)}
+        print('{:28} {:12.2f} us min {:12.2f} us median'.format(
+            name, results[name]['min_us'], results[name]['median_us']), file=sys.stderr)
+    return results
+
+
+def compare(results, baseline, tolerance):
+    '''prints how results differ from baseline, returns the names that regressed;
+       the fastest samples are compared as they are the least disturbed by
+       whatever else the machine is doing'''
+    regressed = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]['min_us']
+        change = result['min_us']/before - 1
+        flag = ''
+        if change > tolerance:
+            flag = '  REGRESSION'
+            regressed.append(name)
+        print('{:28} {:10.2f} -> {:10.2f} us {:+7.1%}{}'.format(
+            name, before, result['min_us'], change, flag), file=sys.stderr)
+    return regressed
+
+
+def main():
+    '''runs the benchmarks from the command line'''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter', default='*', help='glob of benchmarks to run')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='slowdown over the baseline counted as a regression')
+    parser.add_argument('--save', help='write the results here')
+    parser.add_argument('-o', '--output', default='-',
+                        help='write the results as JSON here, - for stdout')
+    args = parser.parse_args()
+
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'results': run_benchmarks(args.filter)}
+    text = json.dumps(report, indent=1, sort_keys=True)
+    for path in (args.output, args.save):
+        if path == '-':
+            print(text)
+        elif path is not None:
+            with open(path, 'w') as results_file:
+                results_file.write(text+'\n')
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+        if compare(report['results'], baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
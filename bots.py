@@ -0,0 +1,368 @@
+"""Computer controllers for DynaBLASTER.
+   A bot plays in place of the keyboard: every tick it is asked for the key
+   bits its player holds, the same bits Player.get_input hands the game.
+
+   SmartBot plans on a DangerMap shared by every bot in the game. The map
+   follows the game's events to keep, for each cell, the earliest time fire
+   will reach it, and caches the distance fields the bots search, dropping
+   them only when a bomb or soft block appears or goes.
+"""
+
+from random import Random
+from time import perf_counter
+from engine import (DIRECTIONS, UP, DOWN, LEFT, RIGHT, BOMB, TILE, SPEED, TICK,
+                    FUSE_TIME, FIRE_TIME)
+from tilemap import HARD_TILE, SOFT_TILE, BOMB_TILE, ITEM_TILE
+
+import importlib
+
+INFINITY = float('inf')
+IMPASSABLE = HARD_TILE | SOFT_TILE | BOMB_TILE
+STEP_KEYS = (RIGHT, LEFT, DOWN, UP) #the direction of each of TileMap.steps
+CELL_TIME = TILE/SPEED*TICK #ms to walk from one cell to the next
+SEARCH_DEPTH = 12 #cells a bot looks ahead
+MAX_FIELDS = 256 #distance fields cached at once
+
+
+class Bot(object):
+    def __init__(self, seed=None):
+        '''initialises the bot with its own random numbers'''
+        self.random = Random(seed)
+
+    def reset(self, game, player):
+        '''called at the start of every round'''
+
+    def keys(self, game, player):
+        '''returns the key bits player holds this tick'''
+        return 0
+
+
+class RandomBot(Bot):
+    def reset(self, game, player):
+        '''forgets the direction it was walking in'''
+        self.direction = 0
+        self.walk = 0
+
+    def keys(self, game, player):
+        '''walks in random directions, now and then dropping a bomb'''
+        if self.walk <= 0:
+            self.direction = self.random.choice(DIRECTIONS)
+            self.walk = self.random.randint(10, 60)
+        self.walk -= 1
+        if self.random.random() < 0.01:
+            return self.direction | BOMB
+        return self.direction
+
+
+class DangerMap(object):
+    def __init__(self, game):
+        '''initialises the map of game and starts following its events'''
+        self.game = game
+        self.on_restored()
+        game.observers.append(self)
+
+    @classmethod
+    def of(cls, game):
+        '''returns the danger map following game, making one if there is none'''
+        for observer in game.observers:
+            if isinstance(observer, cls):
+                return observer
+        return cls(game)
+
+    def on_new_round(self):
+        '''forgets the fire of the last round'''
+        self.burn = {} #position -> earliest time fire reaches it
+        self.cover = {} #position -> {bomb position or fire: time it burns}
+        self.blasts = {} #bomb position -> (time, positions, soft blocks in the way)
+        self.stops = {} #soft block position -> {bomb position stopped by it: None}
+        self.fields = {} #position -> distance field from it
+        self.version = 0 #changes whenever the danger or the way round does
+
+    def on_restored(self):
+        '''works the map out again from the bombs and fire on the board'''
+        self.on_new_round()
+        for bomb in sorted(self.game.bombs.values(), key=lambda bomb: bomb.deadline):
+            self.on_bomb_placed(bomb)
+        for fire in self.game.fires:
+            self.on_fire_created(fire)
+
+    def blast(self, index, power):
+        '''returns the positions the fire of a bomb at index would reach and
+           the soft blocks that would stop it, as Game.detonate works them out'''
+        grid = self.game.tiles.grid
+        reach = self.game.reach
+        cells = [index]
+        stops = []
+        for ray, step in enumerate(self.game.tiles.steps):
+            position = index
+            for i in range(min(power, reach[index*4+ray])):
+                position += step
+                if grid[position] & SOFT_TILE:
+                    stops.append(position)
+                    break
+                cells.append(position)
+        return cells, stops
+
+    def cover_cells(self, source, cells, time):
+        '''marks cells as burning at time because of source'''
+        burn = self.burn
+        for position in cells:
+            self.cover.setdefault(position, {})[source] = time
+            if time < burn.get(position, INFINITY):
+                burn[position] = time
+
+    def uncover_cells(self, source, cells):
+        '''takes the fire of source off cells'''
+        for position in cells:
+            sources = self.cover.get(position)
+            if sources is None or sources.pop(source, None) is None:
+                continue
+            if sources:
+                self.burn[position] = min(sources.values())
+            else:
+                del self.cover[position]
+                del self.burn[position]
+
+    def set_blast(self, index, time):
+        '''works out the fire of the bomb at index going off at time, and
+           brings forward every bomb it sets off sooner than it would go off'''
+        bombs = self.game.bombs
+        queue = [(index, time)]
+        while queue:
+            index, time = queue.pop()
+            self.clear_blast(index)
+            cells, stops = self.blast(index, bombs[index].power)
+            self.blasts[index] = (time, cells, stops)
+            self.cover_cells(index, cells, time)
+            for stop in stops:
+                self.stops.setdefault(stop, {})[index] = None
+            for position in cells[1:]:
+                chained = self.blasts.get(position)
+                if chained is not None and chained[0] > time:
+                    queue.append((position, time))
+        self.changed()
+
+    def clear_blast(self, index):
+        '''forgets the fire of the bomb at index'''
+        blast = self.blasts.pop(index, None)
+        if blast is not None:
+            self.uncover_cells(index, blast[1])
+            for stop in blast[2]:
+                self.stops.get(stop, {}).pop(index, None)
+
+    def changed(self, walls=False):
+        '''notes that the danger changed, and the way round too when walls'''
+        self.version += 1
+        if walls:
+            self.fields.clear()
+
+    def on_bomb_placed(self, bomb):
+        '''adds the fire a new bomb will make'''
+        self.set_blast(bomb.index, min(bomb.deadline, self.burn.get(bomb.index, INFINITY)))
+        self.changed(walls=True)
+
+    def on_bomb_exploded(self, bomb):
+        '''drops the fire of a bomb, its real fire follows'''
+        self.clear_blast(bomb.index)
+        self.changed(walls=True)
+
+    def on_fire_created(self, fire):
+        '''marks the cells of new fire as burning'''
+        self.cover_cells(fire, fire.indices, self.game.time)
+        self.changed()
+
+    def on_fire_removed(self, fire):
+        '''clears the cells of fire that went out'''
+        self.uncover_cells(fire, fire.indices)
+        self.changed()
+
+    def on_rock_removed(self, cell):
+        '''lets the fire of the bombs a soft block stopped reach further'''
+        position = self.game.tiles.index(*cell)
+        for index in list(self.stops.pop(position, {})):
+            if index in self.blasts:
+                self.set_blast(index, self.blasts[index][0])
+        self.changed(walls=True)
+
+    def field(self, start):
+        '''returns {position: (cells away, first direction)} for the cells
+           within SEARCH_DEPTH that can be walked to from start'''
+        field = self.fields.get(start)
+        if field is None:
+            if len(self.fields) >= MAX_FIELDS:
+                self.fields.clear()
+            field = self.fields[start] = self.search(start)
+        return field
+
+    def search(self, start):
+        '''walks outwards from start breadth first'''
+        grid = self.game.tiles.grid
+        steps = list(zip(self.game.tiles.steps, STEP_KEYS))
+        field = {start: (0, 0)}
+        frontier = [start]
+        for distance in range(1, SEARCH_DEPTH+1):
+            reached = []
+            for position in frontier:
+                first = field[position][1]
+                for step, direction in steps:
+                    neighbour = position+step
+                    if neighbour in field or grid[neighbour] & IMPASSABLE:
+                        continue
+                    field[neighbour] = (distance, first or direction)
+                    reached.append(neighbour)
+            frontier = reached
+        return field
+
+    def escape(self, start, now, extra=(), extra_time=INFINITY):
+        '''returns (cells away, first direction) of the nearest cell no fire
+           is heading for that can be reached without getting burnt, or None;
+           extra holds the cells of a bomb that is only being thought about'''
+        grid = self.game.tiles.grid
+        burn = self.burn
+        steps = list(zip(self.game.tiles.steps, STEP_KEYS))
+        def burns_at(position):
+            if position in extra:
+                return min(extra_time, burn.get(position, INFINITY))
+            return burn.get(position, INFINITY)
+        if burns_at(start) == INFINITY:
+            return 0, 0
+        seen = {start: 0}
+        frontier = [start]
+        for distance in range(1, SEARCH_DEPTH+1):
+            arrival = now + distance*CELL_TIME
+            reached = []
+            for position in frontier:
+                first = seen[position]
+                for step, direction in steps:
+                    neighbour = position+step
+                    if neighbour in seen or grid[neighbour] & IMPASSABLE:
+                        continue
+                    time = burns_at(neighbour)
+                    if time == INFINITY:
+                        return distance, first or direction
+                    if arrival + CELL_TIME < time or time + FIRE_TIME < arrival:
+                        seen[neighbour] = first or direction
+                        reached.append(neighbour)
+            frontier = reached
+        return None
+
+
+class SmartBot(Bot):
+    def __init__(self, seed=None):
+        '''initialises the bot and the timing of its decisions'''
+        Bot.__init__(self, seed)
+        self.decisions = 0
+        self.decision_time = 0 #seconds
+
+    def reset(self, game, player):
+        '''finds the danger map of the game and forgets its plans'''
+        self.danger = DangerMap.of(game)
+        self.direction = 0
+        self.version = None
+
+    def keys(self, game, player):
+        '''keeps walking to the next cell, deciding again on reaching it or
+           when the danger changes'''
+        if player.dead:
+            return 0
+        centred = player.x == player.col*TILE and player.y == player.row*TILE
+        if centred or not self.direction or self.version != self.danger.version:
+            start = perf_counter()
+            keys = self.decide(game, player)
+            self.decision_time += perf_counter() - start
+            self.decisions += 1
+            self.version = self.danger.version
+            self.direction = keys & ~BOMB
+            return keys
+        return self.direction
+
+    def decide(self, game, player):
+        '''returns the keys to hold from the cell the player is on'''
+        danger = self.danger
+        index = player.index
+        now = game.time
+        if index in danger.burn:
+            route = danger.escape(index, now)
+            return self.towards(player, route[1] if route else 0)
+        if player.bombs_placed < player.num_bombs and \
+           not game.tiles.grid[index] & BOMB_TILE:
+            cells, stops = danger.blast(index, player.power)
+            if self.worth_bombing(game, player, cells, stops):
+                route = danger.escape(index, now, set(cells), now+FUSE_TIME)
+                if route is not None and route[0] > 0:
+                    return BOMB | route[1]
+        field = danger.field(index)
+        direction = self.choose(game, player, field)
+        if direction:
+            step = game.tiles.steps[STEP_KEYS.index(direction)]
+            if index+step in danger.burn:
+                direction = 0 #wait for the way to clear
+        return self.towards(player, direction)
+
+    def worth_bombing(self, game, player, cells, stops):
+        '''returns whether a bomb here would reach a soft block or an enemy'''
+        if any(stop not in game.dying for stop in stops):
+            return True
+        occupants = game.occupants
+        for position in cells:
+            for other in occupants.get(position, ()):
+                if other is not player and not other.dead:
+                    return True
+        return False
+
+    def choose(self, game, player, field):
+        '''returns the first direction to the most tempting safe cell in
+           field: items first, then places to bomb from, then enemies'''
+        grid = game.tiles.grid
+        steps = game.tiles.steps
+        burn = self.danger.burn
+        occupants = game.occupants
+        can_bomb = player.bombs_placed < player.num_bombs
+        best = []
+        best_score = INFINITY
+        for position, (distance, first) in field.items():
+            if not distance or position in burn:
+                continue
+            if grid[position] & ITEM_TILE:
+                score = distance-3
+            elif can_bomb and any(grid[position+step] & SOFT_TILE and
+                                  position+step not in game.dying for step in steps):
+                score = distance+1
+            elif any(other is not player and not other.dead
+                     for other in occupants.get(position, ())):
+                score = distance+2
+            else:
+                continue
+            if score < best_score:
+                best, best_score = [first], score
+            elif score == best_score:
+                best.append(first)
+        if best:
+            return self.random.choice(best)
+        #nothing in sight, wander to a safe neighbour
+        choices = [direction for position, (distance, direction) in field.items()
+                   if distance == 1 and position not in burn]
+        return self.random.choice(choices) if choices else 0
+
+    def towards(self, player, direction):
+        '''returns direction, or the way back to the centre of the player's
+           cell when it should stand still'''
+        if direction:
+            return direction
+        if player.x != player.col*TILE:
+            return RIGHT if player.x < player.col*TILE else LEFT
+        if player.y != player.row*TILE:
+            return DOWN if player.y < player.row*TILE else UP
+        return 0
+
+
+#bots that can be asked for by name
+BOTS = {'idle': Bot, 'random': RandomBot, 'smart': SmartBot}
+
+
+def load_bot(name):
+    '''returns the bot class called name, from BOTS or given as module:Class'''
+    if name in BOTS:
+        return BOTS[name]
+    module, _, attr = name.partition(':')
+    return getattr(importlib.import_module(module), attr)
@@ -0,0 +1,96 @@
+"""Keyboard input for DynaBLASTER.
+   Two Tk bindings feed every key event into a queue, which the game drains
+   once per tick into the key bits each player holds during that tick. The
+   KeyRelease/KeyPress pairs X11 autorepeat sends while a key is held are
+   dropped, so a held key reads as held. Bindings come from bindings.json:
+   one dict of key names per player, followed by one of general actions.
+"""
+
+from engine import KEYS
+
+import json
+
+AUTOREPEAT_GAP = 2 #ms between the release and press of an autorepeat pair
+
+
+def keysyms(sequence):
+    '''returns the Tk keysyms an event sequence such as <Control_R> or <w>
+       stands for, letters being matched whatever the case'''
+    keysym = sequence.strip()[1:-1]
+    if len(keysym) == 1:
+        return {keysym.lower(), keysym.upper()}
+    return {keysym}
+
+
+def load_bindings(path='bindings.json'):
+    '''returns the players' bindings and the general ones from a file'''
+    with open(path) as bindings_file:
+        bindings = json.load(bindings_file)
+    return bindings[:-1], bindings[-1]
+
+
+class InputQueue(object):
+    def __init__(self, player_bindings, general_bindings):
+        '''compiles the bindings into one lookup from keysym to what it does'''
+        self.keymap = {} #keysym -> (player slot, key bit)
+        for slot, keys in enumerate(player_bindings):
+            for name, sequence in keys.items():
+                for keysym in keysyms(sequence):
+                    self.keymap[keysym] = (slot, KEYS[name])
+        self.actions = {} #keysym -> name of a general action
+        for name, sequence in general_bindings.items():
+            for keysym in keysyms(sequence):
+                self.actions[keysym] = name
+        self.handlers = {} #name of a general action -> function
+        self.events = [] #(pressed, slot, bit, time) since the last drain
+        self.held = [0]*len(player_bindings)
+        self.collapsed = 0 #autorepeat pairs dropped
+
+    def bind(self, widget):
+        '''sends the key events of widget to the queue'''
+        widget.bind('<KeyPress>', self.on_press)
+        widget.bind('<KeyRelease>', self.on_release)
+
+    def on_press(self, event):
+        '''queues a key press, or runs a general action straight away'''
+        action = self.actions.get(event.keysym)
+        if action is not None:
+            if action in self.handlers:
+                self.handlers[action]()
+            return
+        binding = self.keymap.get(event.keysym)
+        if binding is not None:
+            self.events.append((True, binding[0], binding[1], event.time))
+
+    def on_release(self, event):
+        '''queues a key release'''
+        binding = self.keymap.get(event.keysym)
+        if binding is not None:
+            self.events.append((False, binding[0], binding[1], event.time))
+
+    def drain(self):
+        '''reduces the events since the last tick to the key bits each player
+           holds this tick, keys tapped and let go since counting as held,
+           returns those and the bits that were pressed'''
+        held = self.held
+        pressed = [0]*len(held)
+        events = self.events
+        i = 0
+        while i < len(events):
+            down, slot, bit, time = events[i]
+            if not down and i+1 < len(events):
+                next_down, next_slot, next_bit, next_time = events[i+1]
+                if next_down and next_slot == slot and next_bit == bit and \
+                   next_time - time <= AUTOREPEAT_GAP:
+                    self.collapsed += 1
+                    i += 2
+                    continue
+            if down:
+                if not held[slot] & bit:
+                    pressed[slot] |= bit
+                held[slot] |= bit
+            else:
+                held[slot] &= ~bit
+            i += 1
+        del events[:]
+        return [keys | taps for keys, taps in zip(held, pressed)], pressed
@@ -0,0 +1,541 @@
+"""Headless game-state engine for DynaBLASTER.
+   Owns the grid, players, bombs, fire and items and advances with
+   step(inputs, dt). Nothing in here touches Tk, so rounds can be simulated
+   without a display; the classes in DynaBLASTER.py observe a Game and draw it.
+"""
+
+from array import array
+from collections import deque
+from random import Random
+from tilemap import TileMap, HARD_TILE, SOFT_TILE, BOMB_TILE, ITEM_TILE
+
+
+#input bits, one int per player per step
+UP = 1
+DOWN = 2
+LEFT = 4
+RIGHT = 8
+BOMB = 16
+KEYS = {'Up': UP, 'Down': DOWN, 'Left': LEFT, 'Right': RIGHT, 'Bomb': BOMB}
+DIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+VECTORS = {0: (0,0), UP: (0,-1), DOWN: (0,1), LEFT: (-1,0), RIGHT: (1,0)}
+POSITIONS = {0: None, UP: 'back', DOWN: 'forw', LEFT: 'left', RIGHT: 'right'}
+
+ITEMS = ('+bombs', '+power')
+#direction of each fire ray with the images used for its end and middle
+RAYS = ((1, 0, 'right', 'hor'), (-1, 0, 'left', 'hor'),
+        (0, 1, 'bot', 'vert'), (0, -1, 'top', 'vert'))
+
+#positions are integers, fixed point with TILE units to a cell, so lanes,
+#centres and collisions are worked out exactly
+TILE = 32 #size of a cell in position units
+SPEED = 2 #position units moved per tick
+TICK = 1000/60 #ms
+FUSE_TIME = 2730 #ms
+FIRE_TIME = 500 #ms
+SOFT_BLOCK_DEATH_TIME = 600 #ms
+ROUND_END_TIME = 3000 #ms
+ITEM_DROP_CHANCE = 26 #percent of soft blocks that leave an item
+SOFT_BLOCK_DENSITY = 0.5
+BLOCKING = SOFT_TILE | BOMB_TILE #stops a player walking off its cell
+#turns a random byte into a soft block with a chance of SOFT_BLOCK_DENSITY
+DENSITY_TABLE = bytes(SOFT_TILE if i < 256*SOFT_BLOCK_DENSITY else 0
+                      for i in range(256))
+
+
+def cell_of(position):
+    '''returns the cell a position is in, half way between two cells being
+       in the even one'''
+    cell, rest = divmod(position, TILE)
+    if rest*2 > TILE or rest*2 == TILE and cell & 1:
+        cell += 1
+    return cell
+
+
+class PlayerState(object):
+    def __init__(self, player_number, col, row):
+        '''initialises the state of a player that spawns at col, row'''
+        self.player_number = player_number
+        self.start_col = col
+        self.start_row = row
+        self.points = 0
+        self.reset()
+
+    def reset(self):
+        '''puts the player back on its spawn point for a new round'''
+        self.x = self.start_col*TILE
+        self.y = self.start_row*TILE
+        self.col = self.start_col
+        self.row = self.start_row
+        self.keys = 0
+        self.heading = 0
+        self.v_vector = [0,0]
+        self.position = None #direction being walked in, None when standing
+        self.facing = 'forw'
+        self.dead = False
+        self.power = 2
+        self.num_bombs = 1
+        self.bombs_placed = 0
+        self.bombs_dropped = 0 #bombs placed this round
+        self.items_picked = 0 #items picked up this round
+
+    @property
+    def row_col(self):
+        '''the cell the player is standing on'''
+        return self.col, self.row
+
+
+class Observers(list):
+    def __init__(self, observers=()):
+        '''initialises the list of a game's observers, whose handler for
+           each event is looked up once, on the first event after the list
+           last changed'''
+        list.__init__(self, observers)
+        self.handlers = {} #event -> bound on_<event> methods
+
+    def append(self, observer):
+        '''adds an observer'''
+        list.append(self, observer)
+        self.handlers.clear()
+
+    def remove(self, observer):
+        '''removes an observer'''
+        list.remove(self, observer)
+        self.handlers.clear()
+
+    def of(self, event):
+        '''returns the handlers of event'''
+        handlers = self.handlers.get(event)
+        if handlers is None:
+            name = 'on_'+event
+            handlers = [getattr(observer, name) for observer in self
+                        if hasattr(observer, name)]
+            self.handlers[event] = handlers
+        return handlers
+
+
+#bombs, fire and items live from the event that creates them (bomb_placed,
+#fire_created, item_dropped) to the one that removes them (bomb_exploded,
+#fire_removed, item_removed) or the next new_round, and observers let go of
+#whatever they keep for one then; slots keep the many short-lived ones small
+class Bomb(object):
+    __slots__ = ('owner', 'col', 'row', 'index', 'power', 'deadline')
+
+    def __init__(self, owner, col, row, index, power, deadline):
+        '''initialises a bomb placed by owner that goes off at deadline'''
+        self.owner = owner
+        self.col = col
+        self.row = row
+        self.index = index
+        self.power = power
+        self.deadline = deadline
+
+
+class Fire(object):
+    __slots__ = ('owner', 'cells', 'indices', 'deadline')
+
+    def __init__(self, owner, cells, indices, deadline):
+        '''initialises the fire of one bomb, cells holds (col, row, kind)
+           and indices the same cells as positions in the tile map'''
+        self.owner = owner
+        self.cells = cells
+        self.indices = indices
+        self.deadline = deadline
+
+
+class Item(object):
+    __slots__ = ('name', 'col', 'row', 'index', 'owner')
+
+    def __init__(self, name, col, row, index, owner):
+        '''initialises an item dropped by a soft block owner destroyed'''
+        self.name = name
+        self.col = col
+        self.row = row
+        self.index = index
+        self.owner = owner
+
+
+class Game(object):
+    def __init__(self, num_cols=7, num_rows=6, num_players=2, seed=None,
+                 drop_chance=ITEM_DROP_CHANCE, maps=None):
+        '''initialises the game, num_cols and num_rows count the lanes
+           the players can walk along; each round draws its soft blocks
+           from maps, a list of vetted layers, when given'''
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.cols = num_cols*2-1
+        self.rows = num_rows*2-1
+        if seed is None:
+            seed = Random().getrandbits(32)
+        self.seed = seed
+        self.recorder = None
+        self.drop_chance = drop_chance
+        self.maps = maps
+        self.observers = Observers()
+        self.tiles = TileMap(self.cols, self.rows)
+        self.reach = self.tiles.ray_lengths()
+        spawns = self.spawn_points(num_players)
+        self.players = [PlayerState(i+1, col, row) for i, (col, row)
+                        in enumerate(spawns)]
+        #cells soft blocks may be placed on, away from the spawn points
+        self.soft_mask = self.tiles.layer(SOFT_TILE, [
+            (col,row) for col in range(self.cols) for row in range(self.rows)
+            if not self.tiles.get(col, row) & HARD_TILE and
+            not any(abs(col-c) <= 1 and abs(row-r) <= 1 for c, r in spawns)])
+        self.round_num = 0
+        self.new_round()
+
+    def spawn_points(self, num_players):
+        '''returns the cells the players start on: the corners first, then
+           each time the lane crossing furthest from every spawn so far'''
+        last_col, last_row = self.cols-1, self.rows-1
+        spawns = list(dict.fromkeys([(0,0), (last_col,last_row),
+                                     (last_col,0), (0,last_row)]))
+        crossings = [(col,row) for row in range(0, self.rows, 2)
+                     for col in range(0, self.cols, 2)]
+        if num_players > len(crossings):
+            raise ValueError('a {}x{} map has no room for {} players'.format(
+                self.cols, self.rows, num_players))
+        nearest = {cell: min((cell[0]-col)**2 + (cell[1]-row)**2
+                             for col, row in spawns) for cell in crossings}
+        while len(spawns) < num_players:
+            spawn = max(crossings, key=nearest.get)
+            spawns.append(spawn)
+            for cell in crossings:
+                nearest[cell] = min(nearest[cell], (cell[0]-spawn[0])**2 +
+                                    (cell[1]-spawn[1])**2)
+        return spawns[:num_players]
+
+    def notify(self, event, *args):
+        '''tells every observer that event happened'''
+        for handler in self.observers.of(event):
+            handler(*args)
+
+    def new_round(self):
+        '''resets the board and the players to play a new round'''
+        self.round_num += 1
+        self.random = Random(self.round_seed())
+        self.tick = 0
+        self.time = 0
+        self.travel = 0
+        self.round_over = False
+        self.winner = None
+        self.end_time = None
+        self.bombs = {}
+        self.items = {}
+        self.fires = deque()
+        self.dying = {}
+        self.burning = array('H', [0])*len(self.tiles.grid)
+        self.layout = self.generate_rocks()
+        self.tiles.reset(self.layout)
+        self.place_players()
+        self.notify('new_round')
+
+    def place_players(self):
+        '''puts every player back on its spawn point, alive'''
+        self.occupants = {} #tile map position -> players standing there
+        for player in self.players:
+            player.reset()
+            player.index = self.tiles.index(player.col, player.row)
+            self.occupants.setdefault(player.index, []).append(player)
+        self.num_alive = len(self.players)
+
+    def round_seed(self):
+        '''returns the seed of this round's random numbers, so a round can be
+           played again from its start knowing only the game's seed'''
+        return '{}:{}'.format(self.seed, self.round_num)
+
+    def generate_rocks(self):
+        '''returns the soft block layer for a new round, drawing a random
+           byte for every cell in one go or one of the vetted maps'''
+        if self.maps:
+            #always one word, so the rest of the round draws the same
+            #numbers whichever list the map came from
+            return self.maps[self.random.getrandbits(32) % len(self.maps)]
+        size = len(self.tiles.grid)
+        noise = self.random.getrandbits(8*size).to_bytes(size, 'little')
+        return int.from_bytes(noise.translate(DENSITY_TABLE), 'little') & self.soft_mask
+
+    def rocks(self):
+        '''returns the cells that hold a soft block'''
+        return self.tiles.cells(SOFT_TILE)
+
+    def pending(self):
+        '''returns the number of timed events waiting to happen: fuses,
+           fires and soft blocks burning, and the end of the round'''
+        return (len(self.bombs) + len(self.fires) + len(self.dying) +
+                (self.end_time is not None and not self.round_over))
+
+    def alive_players(self):
+        '''returns the players that are still alive'''
+        return [player for player in self.players if not player.dead]
+
+    def occupy(self, player, index):
+        '''moves player to the tile map position index, where fire kills it'''
+        occupants = self.occupants[player.index]
+        occupants.remove(player)
+        if not occupants:
+            del self.occupants[player.index]
+        player.index = index
+        self.occupants.setdefault(index, []).append(player)
+        if self.burning[index]:
+            self.kill(player)
+
+    def step(self, inputs, dt=TICK):
+        '''advances the game by dt ms, inputs holds the key bits of each player'''
+        if self.round_over:
+            return
+        if self.recorder is not None:
+            self.recorder.record(self.tick, inputs)
+        self.tick += 1
+        self.time += dt
+        for player, keys in zip(self.players, inputs):
+            if not player.dead:
+                self.handle_input(player, keys)
+        travel = self.travel + SPEED*dt/TICK
+        distance = int(travel)
+        self.travel = travel - distance #carried over to keep positions whole
+        for player in self.players:
+            if not player.dead:
+                self.move_player(player, distance)
+
+        #every bomb, fire and soft block lasts as long as the others of its
+        #kind, so the ones that are due are always at the front
+        due = []
+        for bomb in self.bombs.values():
+            if bomb.deadline > self.time:
+                break
+            due.append(bomb)
+        if due:
+            self.detonate(due)
+        while self.fires and self.fires[0].deadline <= self.time:
+            self.remove_fire(self.fires.popleft())
+        if self.dying:
+            gone = []
+            for index, deadline in self.dying.items():
+                if deadline > self.time:
+                    break
+                gone.append(index)
+            for index in gone:
+                del self.dying[index]
+                self.tiles.grid[index] &= ~SOFT_TILE
+                self.notify('rock_removed', self.tiles.cell(index))
+
+        if self.end_time is not None and self.end_time <= self.time:
+            self.end_round()
+
+    def handle_input(self, player, keys):
+        '''turns the key bits of a player into a heading and bomb placement,
+           the most recently pressed direction wins'''
+        pressed = keys & ~player.keys
+        player.keys = keys
+        heading = player.heading
+        for direction in DIRECTIONS:
+            if pressed & direction:
+                heading = direction
+                break
+        if not keys & heading:
+            heading = 0
+            for direction in DIRECTIONS:
+                if keys & direction:
+                    heading = direction
+                    break
+        player.heading = heading
+        player.v_vector = list(VECTORS[heading])
+        player.position = POSITIONS[heading]
+        if heading:
+            player.facing = player.position
+        if pressed & BOMB:
+            self.place_bomb(player)
+
+    def move_player(self, player, distance):
+        '''moves the player along the lanes, stopping it at blocks and bombs'''
+        lane = 2*TILE
+        vx, vy = player.v_vector
+        ver_line = (player.x + TILE)//lane #the nearest lanes
+        hor_line = (player.y + TILE)//lane
+        near_ver_line = abs(player.x - ver_line*lane)*5 < lane*2
+        near_hor_line = abs(player.y - hor_line*lane)*5 < lane*2
+        if not near_ver_line:
+            vy = 0
+        if not near_hor_line:
+            vx = 0
+
+        #stop player at the boundaries
+        if player.x <= 0 and vx < 0 or \
+           player.x >= (self.num_cols-1)*lane and vx > 0:
+            vx = 0
+        if player.y <= 0 and vy < 0 or \
+           player.y >= (self.num_rows-1)*lane and vy > 0:
+            vy = 0
+
+        grid = self.tiles.grid
+        width = self.tiles.width
+        index = (player.row+1)*width + player.col+1
+        #picking up item
+        if grid[index] & ITEM_TILE:
+            self.use_item(player, index)
+
+        #stops player when meeting a soft block or a bomb
+        if vx < 0:
+            if grid[index-1] & BLOCKING and player.x <= player.col*TILE:
+                vx = 0
+        elif vx > 0:
+            if grid[index+1] & BLOCKING and player.x >= player.col*TILE:
+                vx = 0
+        elif vy < 0:
+            if grid[index-width] & BLOCKING and player.y <= player.row*TILE:
+                vy = 0
+        elif vy > 0:
+            if grid[index+width] & BLOCKING and player.y >= player.row*TILE:
+                vy = 0
+
+        #gets player to the centre of the lane it is turning along
+        if near_hor_line and vx != 0:
+            player.y += self.towards(hor_line*lane - player.y, distance)
+        if near_ver_line and vy != 0:
+            player.x += self.towards(ver_line*lane - player.x, distance)
+
+        player.x += vx*distance
+        player.y += vy*distance
+        player.col = cell_of(player.x)
+        player.row = cell_of(player.y)
+        index = (player.row+1)*width + player.col+1
+        if index != player.index:
+            self.occupy(player, index)
+
+    def towards(self, dif, distance):
+        '''returns how far to move to close dif without overshooting'''
+        if dif < 0:
+            return max(dif, -distance)
+        return min(dif, distance)
+
+    def place_bomb(self, player):
+        '''places a bomb under the player if it has one left'''
+        if player.bombs_placed < player.num_bombs and not player.dead:
+            index = self.tiles.index(player.col, player.row)
+            if not self.tiles.grid[index] & BOMB_TILE:
+                bomb = Bomb(player, player.col, player.row, index, player.power,
+                            self.time+FUSE_TIME)
+                self.bombs[index] = bomb
+                self.tiles.grid[index] |= BOMB_TILE
+                player.bombs_placed += 1
+                player.bombs_dropped += 1
+                self.notify('bomb_placed', bomb)
+
+    def detonate(self, bombs):
+        '''sets off bombs and every bomb their fire reaches in one pass,
+           returns the positions of every cell the blast affected'''
+        grid = self.tiles.grid
+        width = self.tiles.width
+        reach = self.reach
+        queue = deque()
+        for bomb in bombs:
+            self.remove_bomb(bomb)
+            queue.append(bomb)
+        affected = set()
+        while queue:
+            bomb = queue.popleft()
+            cells = [(bomb.col, bomb.row, 'mid')]
+            indices = [bomb.index]
+            for ray, (d1, d2, end, side) in enumerate(RAYS):
+                step = d1 + d2*width
+                index = bomb.index
+                for i in range(1, min(bomb.power, reach[bomb.index*4+ray])+1):
+                    index += step
+                    tile = grid[index]
+                    if tile & BOMB_TILE: #fire touches another bomb
+                        chained = self.bombs[index]
+                        self.remove_bomb(chained)
+                        queue.append(chained)
+                    if tile & ITEM_TILE:
+                        self.use_item(None, index)
+                    if tile & SOFT_TILE:
+                        self.destroy_rock(index, bomb.owner)
+                        affected.add(index)
+                        break
+                    cells.append((bomb.col+i*d1, bomb.row+i*d2,
+                                  end if i==bomb.power else side))
+                    indices.append(index)
+            self.add_fire(Fire(bomb.owner, cells, indices, self.time+FIRE_TIME))
+            affected.update(indices)
+        return affected
+
+    def remove_bomb(self, bomb):
+        '''takes a bomb that is going off off the board'''
+        del self.bombs[bomb.index]
+        self.tiles.grid[bomb.index] &= ~BOMB_TILE
+        bomb.owner.bombs_placed -= 1
+        self.notify('bomb_exploded', bomb)
+
+    def add_fire(self, fire):
+        '''puts the fire of a bomb on the board, killing whoever stands in it'''
+        burning = self.burning
+        occupants = self.occupants
+        hit = []
+        for index in fire.indices:
+            burning[index] += 1
+            if index in occupants:
+                hit.extend(occupants[index])
+        self.fires.append(fire)
+        self.notify('fire_created', fire)
+        for player in hit:
+            self.kill(player)
+
+    def remove_fire(self, fire):
+        '''takes the fire of a bomb off the board'''
+        burning = self.burning
+        for index in fire.indices:
+            burning[index] -= 1
+        self.notify('fire_removed', fire)
+
+    def destroy_rock(self, index, owner):
+        '''starts destroying a soft block, which may drop an item'''
+        if index in self.dying:
+            return
+        self.dying[index] = self.time+SOFT_BLOCK_DEATH_TIME
+        self.notify('rock_destroyed', self.tiles.cell(index), owner)
+        if self.random.randint(0,99) < self.drop_chance:
+            self.drop_item(index, owner)
+
+    def drop_item(self, index, owner):
+        '''creates a random item on the cell at index'''
+        chance = self.random.randint(0,99)
+        name = ITEMS[int(chance // (100/len(ITEMS)))]
+        col, row = self.tiles.cell(index)
+        item = Item(name, col, row, index, owner)
+        self.items[index] = item
+        self.tiles.grid[index] |= ITEM_TILE
+        self.notify('item_dropped', item)
+
+    def use_item(self, player, index):
+        '''removes the item at index, player gains its properties if given'''
+        item = self.items.pop(index)
+        self.tiles.grid[index] &= ~ITEM_TILE
+        if player is not None:
+            player.items_picked += 1
+            if item.name == '+power':
+                player.power += 1
+            elif item.name == '+bombs':
+                player.num_bombs += 1
+        self.notify('item_removed', item, player)
+
+    def kill(self, player):
+        '''handles the death of the player'''
+        if player.dead:
+            return
+        player.dead = True
+        player.position = None
+        self.num_alive -= 1
+        self.notify('player_died', player)
+        if self.num_alive < 2 and self.end_time is None:
+            self.end_time = self.time+ROUND_END_TIME
+
+    def end_round(self):
+        '''ends the round, giving a point to the last player standing'''
+        winner = self.alive_players()[0] if self.num_alive else None
+        if winner is not None:
+            winner.points += 1
+        self.winner = winner
+        self.round_over = True
+        self.notify('round_ended', winner)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+
+"""Vetted maps for DynaBLASTER.
+   A candidate map is drawn the way Game.generate_rocks draws one, then
+   checked from every spawn point before it is kept. The checks run on whole
+   boards at once: a layer holds one bit in the byte of each cell, so taking
+   a step in every direction from a set of cells is four shifts, and a flood
+   fill is a few of those in a loop rather than a walk over the cells.
+
+   A map is kept when every player can get out of the way of the first bomb
+   they place and the players start with much the same soft blocks around
+   them. Kept maps go into a library on disk, a file for each size, density
+   and number of players, so a game can draw each round from it straight away:
+
+       python3 mapgen.py --cols 7 --rows 6 --players 2 --count 1000
+       python3 DynaBLASTER.py --maps maps
+"""
+
+from engine import Game, SPEED, TICK, TILE, FUSE_TIME, SOFT_BLOCK_DENSITY
+from random import Random
+from time import perf_counter
+
+import argparse
+import os
+import struct
+import zlib
+
+LIBRARY_DIR = 'maps'
+MAGIC = b'DBML'
+VERSION = 1
+HEADER = struct.Struct('<4sBHHBBI') #magic, version, lanes across and down,
+                                    #players, density in percent, maps
+FIRST_POWER = 2 #reach of the first bomb a player places
+ESCAPE_STEPS = int(FUSE_TIME/TICK*SPEED//TILE) #cells walked before a fuse ends
+NEIGHBOURHOOD = 6 #steps from a spawn point counted as its surroundings
+BALANCE = 0.25 #most the share of soft blocks round two spawns may differ by
+MAX_CANDIDATES = 1000 #candidates drawn per map wanted before giving up
+
+
+class MapGenerator(object):
+    def __init__(self, game, density=SOFT_BLOCK_DENSITY):
+        '''initialises a generator of soft block layers for game's board,
+           a cell holding a soft block with a chance of density'''
+        self.game = game
+        self.density = density
+        tiles = game.tiles
+        self.size = size = len(tiles.grid)
+        self.table = bytes(2 if i < 256*density else 0 for i in range(256))
+        self.row = 8*tiles.width #bits from a cell to the one below
+        ones = int.from_bytes(b'\1'*size, 'little')
+        self.walkable = ones & ~tiles.static #hard blocks hold the low bit
+        self.placeable = game.soft_mask >> 1
+        self.spawns = []
+        for player in game.players:
+            index = tiles.index(player.start_col, player.start_row)
+            blast = [index]
+            for ray, step in enumerate(tiles.steps):
+                length = min(FIRST_POWER, game.reach[index*4+ray])
+                blast.extend(index+step*i for i in range(1, length+1))
+            near = self.flood(1 << 8*index, self.walkable, NEIGHBOURHOOD)
+            self.spawns.append((1 << 8*index, self.bits(blast),
+                                near & self.placeable))
+        self.drawn = 0
+        self.accepted = 0
+
+    def bits(self, indices):
+        '''returns a layer with the bit of each of indices set'''
+        layer = 0
+        for index in indices:
+            layer |= 1 << 8*index
+        return layer
+
+    def flood(self, start, open_cells, steps=None):
+        '''returns the open cells reachable from start, within steps steps
+           when given'''
+        row = self.row
+        reach = start
+        while steps is None or steps > 0:
+            grown = (reach | reach << 8 | reach >> 8 | reach << row |
+                     reach >> row) & open_cells
+            if grown == reach:
+                break
+            reach = grown
+            if steps is not None:
+                steps -= 1
+        return reach
+
+    def candidate(self, random):
+        '''returns a soft block layer drawn with random, checked or not'''
+        self.drawn += 1
+        noise = random.getrandbits(8*self.size).to_bytes(self.size, 'little')
+        return int.from_bytes(noise.translate(self.table), 'little') & self.game.soft_mask
+
+    def fair(self, layer):
+        '''returns whether every player could escape the first bomb they
+           place on a layer and the soft blocks are shared out evenly'''
+        soft = layer >> 1
+        free = self.walkable & ~soft
+        shares = []
+        for start, blast, near in self.spawns:
+            if not self.flood(start, free, ESCAPE_STEPS) & ~blast:
+                return False
+            shares.append((soft & near).bit_count()/max(near.bit_count(), 1))
+        return max(shares)-min(shares) <= BALANCE
+
+
+class MapLibrary(object):
+    def __init__(self, directory=LIBRARY_DIR):
+        '''initialises a library of vetted maps kept in directory'''
+        self.directory = directory
+
+    def path(self, num_cols, num_rows, num_players, density):
+        '''returns the file holding the maps of a size, number of players
+           and density'''
+        return os.path.join(self.directory, '{}x{}-{}p-{}.dbm'.format(
+            num_cols, num_rows, num_players, round(density*100)))
+
+    def load(self, num_cols, num_rows, num_players, density=SOFT_BLOCK_DENSITY):
+        '''returns the layers kept for a size, number of players and
+           density, None when there are none'''
+        path = self.path(num_cols, num_rows, num_players, density)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as library_file:
+            data = library_file.read()
+        magic, version, cols, rows, players, percent, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(path+' is not a version {} map library'.format(VERSION))
+        maps = zlib.decompress(data[HEADER.size:])
+        size = len(maps)//count if count else 0
+        return [int.from_bytes(maps[i:i+size], 'little')
+                for i in range(0, count*size, size)]
+
+    def save(self, num_cols, num_rows, num_players, density, layers, size):
+        '''writes layers of size bytes each to the library'''
+        path = self.path(num_cols, num_rows, num_players, density)
+        os.makedirs(self.directory, exist_ok=True)
+        data = HEADER.pack(MAGIC, VERSION, num_cols, num_rows, num_players,
+                           round(density*100), len(layers)) + zlib.compress(
+            b''.join(layer.to_bytes(size, 'little') for layer in layers))
+        partial = path+'.part'
+        with open(partial, 'wb') as library_file:
+            library_file.write(data)
+        os.replace(partial, path) #never leaves half a library behind
+
+    def build(self, num_cols, num_rows, num_players, density=SOFT_BLOCK_DENSITY,
+              count=1000, seed=0):
+        '''draws count fair maps, saves them and returns them with the
+           generator that drew them; raises ValueError when too few of the
+           candidates drawn are fair'''
+        generator = MapGenerator(Game(num_cols, num_rows, num_players, seed=0), density)
+        random = Random(seed)
+        layers = []
+        while len(layers) < count:
+            if generator.drawn >= count*MAX_CANDIDATES:
+                raise ValueError('fewer than {} of {} candidate {}x{} maps for {} '
+                                 'players at density {:g} are fair'.format(
+                                     count, generator.drawn, num_cols, num_rows,
+                                     num_players, density))
+            layer = generator.candidate(random)
+            if generator.fair(layer):
+                layers.append(layer)
+        generator.accepted = len(layers)
+        self.save(num_cols, num_rows, num_players, density, layers, generator.size)
+        return layers, generator
+
+    def maps(self, num_cols, num_rows, num_players, density=SOFT_BLOCK_DENSITY,
+             count=1000):
+        '''returns the layers kept for a size, number of players and
+           density, building them first when there are none'''
+        layers = self.load(num_cols, num_rows, num_players, density)
+        if layers is None:
+            layers = self.build(num_cols, num_rows, num_players, density, count)[0]
+        return layers
+
+
+def main():
+    '''fills the library for a size from the command line'''
+    parser = argparse.ArgumentParser(description='draws fair maps into the library')
+    parser.add_argument('--cols', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--density', type=float, default=SOFT_BLOCK_DENSITY)
+    parser.add_argument('--count', type=int, default=1000, help='maps to keep')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--library', default=LIBRARY_DIR, help='where to keep them')
+    args = parser.parse_args()
+    library = MapLibrary(args.library)
+    start = perf_counter()
+    layers, generator = library.build(args.cols, args.rows, args.players,
+                                      args.density, args.count, args.seed)
+    elapsed = perf_counter() - start
+    print('{} of {} candidates kept, {:.0f} candidates/s'.format(
+        generator.accepted, generator.drawn, generator.drawn/elapsed))
+    path = library.path(args.cols, args.rows, args.players, args.density)
+    start = perf_counter()
+    library.load(args.cols, args.rows, args.players, args.density)
+    print('{}: {} bytes, loaded in {:.1f} ms'.format(
+        path, os.path.getsize(path), (perf_counter() - start)*1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,686 @@
+#!/usr/bin/env python3
+
+"""Network multiplayer for DynaBLASTER.
+   An asyncio UDP server runs the authoritative Game and takes the same
+   Up/Down/Left/Right/Bomb inputs as bindings.json from every client. Each
+   snapshot it sends is a delta against the last one the client acknowledged,
+   and clients predict their own player's movement between snapshots.
+
+       python3 netplay.py server --port 7777
+       python3 DynaBLASTER.py --connect localhost:7777
+       python3 netplay.py demo --latency 80 --jitter 20 --loss 0.05
+
+   demo plays bots against each other over localhost and reports bandwidth
+   and tick-processing time per client.
+"""
+
+from engine import (Game, Bomb, Fire, Item, KEYS, BOMB, POSITIONS, VECTORS,
+                    SPEED, TICK, cell_of)
+from tilemap import SOFT_TILE, BOMB_TILE, ITEM_TILE
+from bots import load_bot
+from collections import deque
+from random import Random
+from time import perf_counter
+
+import argparse
+import asyncio
+import json
+import threading
+
+SNAPSHOT_EVERY = 2 #ticks between snapshots
+HISTORY = 64 #snapshots kept as baselines for deltas
+INPUT_REDUNDANCY = 4 #past inputs repeated in every input packet
+INPUT_BUFFER = 4 #inputs a server keeps per client before merging them
+SOFT_CHUNK = 1024 #cells of the tile map per soft block bitmap
+NAMES = sorted(KEYS, key=KEYS.get)
+#turns the tile map into one '1' or '0' per cell, whether it holds a soft block
+SOFT_BITS = bytes(ord('1') if i & SOFT_TILE else ord('0') for i in range(256))
+
+
+def keys_to_names(keys):
+    '''returns the names of the keys set in keys'''
+    return [name for name in NAMES if keys & KEYS[name]]
+
+
+def names_to_keys(names):
+    '''returns the key bits of a list of key names'''
+    keys = 0
+    for name in names:
+        keys |= KEYS.get(name, 0)
+    return keys
+
+
+def encode_player(player):
+    '''returns the entry of a player'''
+    return [player.x, player.y, int(player.dead), player.heading, player.facing,
+            player.power, player.num_bombs, player.points]
+
+
+def fire_key(fire):
+    '''returns the key of the entry of a fire'''
+    return 'f{}:{}'.format(fire.indices[0], int(fire.deadline))
+
+
+def encode_fire(fire):
+    '''returns the entry of a fire, lists throughout so it compares equal
+       to the entry read back from JSON'''
+    return [fire.owner.player_number, [list(cell) for cell in fire.cells]]
+
+
+def encode_soft(grid, chunk):
+    '''returns the soft blocks of SOFT_CHUNK cells of the tile map as hex
+       digits, one bit per cell, so even the largest maps fit a datagram'''
+    bits = bytes(grid[chunk*SOFT_CHUNK:(chunk+1)*SOFT_CHUNK]).translate(SOFT_BITS)
+    return '{:0{}x}'.format(int(bits, 2), (len(bits)+3)//4)
+
+
+def decode_soft(chunk, value, size):
+    '''returns the tile map positions of the soft blocks in a chunk'''
+    start = chunk*SOFT_CHUNK
+    length = min(SOFT_CHUNK, size-start)
+    bits = bin(int(value, 16))[2:].zfill(length)[-length:]
+    return [start+i for i, bit in enumerate(bits) if bit == '1']
+
+
+def encode(game):
+    '''returns the state of game as a flat dict of JSON values,
+       one entry per entity, or per chunk of soft blocks, so deltas stay small'''
+    winner = game.winner.player_number if game.winner else 0
+    state = {'g': [game.round_num, int(game.round_over), winner, int(game.time)]}
+    for player in game.players:
+        state['p'+str(player.player_number)] = encode_player(player)
+    for index, bomb in game.bombs.items():
+        state['b'+str(index)] = [bomb.col, bomb.row, bomb.owner.player_number]
+    for index, item in game.items.items():
+        state['i'+str(index)] = [item.name, item.owner.player_number]
+    grid = game.tiles.grid
+    for chunk in range((len(grid)+SOFT_CHUNK-1)//SOFT_CHUNK):
+        state['s'+str(chunk)] = encode_soft(grid, chunk)
+    for index in game.dying:
+        state['d'+str(index)] = 1
+    for fire in game.fires:
+        state[fire_key(fire)] = encode_fire(fire)
+    return state
+
+
+def diff(old, new):
+    '''returns the entries of new that differ from old and the keys of old
+       that are gone'''
+    changed = {key: value for key, value in new.items() if old.get(key) != value}
+    removed = [key for key in old if key not in new]
+    return changed, removed
+
+
+def patch(old, changed, removed):
+    '''returns old with a delta applied'''
+    new = dict(old)
+    new.update(changed)
+    for key in removed:
+        new.pop(key, None)
+    return new
+
+
+class Link(object):
+    def __init__(self, latency=0, jitter=0, loss=0, seed=None):
+        '''initialises a simulated network link, times in ms'''
+        self.latency = latency/1000
+        self.jitter = jitter/1000
+        self.loss = loss
+        self.random = Random(seed)
+        self.sent = 0
+        self.dropped = 0
+        self.bytes = 0
+
+    def send(self, transport, data, addr=None):
+        '''sends data late, or not at all, as the link is set up to'''
+        self.sent += 1
+        self.bytes += len(data)
+        if self.loss and self.random.random() < self.loss:
+            self.dropped += 1
+            return
+        delay = self.latency + self.jitter*self.random.random()
+        if delay <= 0:
+            transport.sendto(data, addr)
+        else:
+            asyncio.get_running_loop().call_later(delay, transport.sendto, data, addr)
+
+
+class RemoteClient(object):
+    def __init__(self, addr, slot):
+        '''initialises the server's record of a connected client'''
+        self.addr = addr
+        self.slot = slot
+        self.inputs = deque()
+        self.last_seq = 0 #newest input received
+        self.input_ack = 0 #newest input applied to the game
+        self.keys = 0
+        self.snapshot_ack = None #newest snapshot the client has
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.encode_time = 0
+
+    def next_input(self):
+        '''returns the keys to use for this tick, one buffered input per tick'''
+        if len(self.inputs) > INPUT_BUFFER: #the client got ahead, catch up
+            bomb = 0
+            while len(self.inputs) > 1:
+                bomb |= self.inputs.popleft()[1] & BOMB
+            seq, keys = self.inputs.popleft()
+            keys |= bomb
+        elif self.inputs:
+            seq, keys = self.inputs.popleft()
+        else: #nothing arrived in time, keep walking but do not bomb again
+            return self.keys & ~BOMB
+        self.input_ack = seq
+        self.keys = keys
+        return keys
+
+
+class GameServer(asyncio.DatagramProtocol):
+    def __init__(self, game, link=None):
+        '''initialises the server that runs game'''
+        self.game = game
+        self.link = link or Link()
+        self.clients = {}
+        self.history = {}
+        self.snapshot_seq = 0
+        self.tick_num = 0
+        self.tick_time = 0
+        self.max_tick_time = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def send(self, client, message):
+        '''sends message to client'''
+        data = json.dumps(message, separators=(',', ':')).encode()
+        client.bytes_sent += len(data)
+        self.link.send(self.transport, data, client.addr)
+
+    def datagram_received(self, data, addr):
+        '''handles a message from a client'''
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return
+        client = self.clients.get(addr)
+        if message.get('t') == 'join':
+            if client is None:
+                taken = set(c.slot for c in self.clients.values())
+                free = [i for i in range(len(self.game.players)) if i not in taken]
+                if not free:
+                    return
+                client = self.clients[addr] = RemoteClient(addr, free[0])
+            self.send(client, {'t': 'welcome', 'player': client.slot,
+                               'num_cols': self.game.num_cols,
+                               'num_rows': self.game.num_rows,
+                               'num_players': len(self.game.players)})
+        elif client is None:
+            return
+        client.bytes_received += len(data)
+        if message.get('t') == 'in':
+            for seq, names in message['in']:
+                if seq > client.last_seq:
+                    client.inputs.append((seq, names_to_keys(names)))
+                    client.last_seq = seq
+            ack = message.get('ack')
+            if ack in self.history and (client.snapshot_ack is None or
+                                        ack > client.snapshot_ack):
+                client.snapshot_ack = ack
+        elif message.get('t') == 'rematch':
+            if self.game.round_over:
+                self.game.new_round()
+        elif message.get('t') == 'bye':
+            del self.clients[addr]
+
+    def tick(self):
+        '''advances the game one tick and sends snapshots when due'''
+        start = perf_counter()
+        if len(self.clients) == len(self.game.players):
+            inputs = [0]*len(self.game.players)
+            for client in self.clients.values():
+                inputs[client.slot] = client.next_input()
+            self.game.step(inputs, TICK)
+        self.tick_num += 1
+        if self.tick_num % SNAPSHOT_EVERY == 0:
+            self.broadcast()
+        elapsed = perf_counter() - start
+        self.tick_time += elapsed
+        self.max_tick_time = max(self.max_tick_time, elapsed)
+
+    def broadcast(self):
+        '''sends every client the state as a delta against what it last acknowledged'''
+        state = encode(self.game)
+        self.snapshot_seq += 1
+        self.history[self.snapshot_seq] = state
+        self.history.pop(self.snapshot_seq-HISTORY, None)
+        for client in self.clients.values():
+            start = perf_counter()
+            base = client.snapshot_ack
+            if base not in self.history:
+                base = None
+            changed, removed = diff(self.history[base] if base else {}, state)
+            self.send(client, {'t': 'snap', 'seq': self.snapshot_seq, 'base': base,
+                               'ack': client.input_ack, 'set': changed, 'del': removed})
+            client.encode_time += perf_counter() - start
+
+    def report(self):
+        '''returns lines describing bandwidth and tick time per client'''
+        seconds = self.tick_num*TICK/1000 or 1
+        ticks = self.tick_num or 1
+        lines = ['server: {} ticks, {:.3f} ms average, {:.3f} ms worst per tick'.format(
+            self.tick_num, self.tick_time/ticks*1000, self.max_tick_time*1000)]
+        for client in sorted(self.clients.values(), key=lambda c: c.slot):
+            lines.append('  player {}: {:.2f} kB/s down, {:.2f} kB/s up, '
+                         '{:.3f} ms encoding per tick'.format(
+                             client.slot+1, client.bytes_sent/seconds/1000,
+                             client.bytes_received/seconds/1000,
+                             client.encode_time/ticks*1000))
+        return lines
+
+
+class GameClient(asyncio.DatagramProtocol):
+    def __init__(self, link=None):
+        '''initialises a client, messages from the server are queued'''
+        self.link = link or Link()
+        self.welcome = None
+        self.snapshots = deque()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.loop = asyncio.get_running_loop()
+        self.joined = self.loop.create_future()
+
+    def datagram_received(self, data, addr):
+        self.bytes_received += len(data)
+        message = json.loads(data)
+        if message['t'] == 'welcome':
+            if self.welcome is None:
+                self.welcome = message
+                self.joined.set_result(message)
+        elif message['t'] == 'snap':
+            self.snapshots.append(message)
+
+    def send(self, message):
+        '''sends message to the server, safe to call from any thread'''
+        data = json.dumps(message, separators=(',', ':')).encode()
+        self.bytes_sent += len(data)
+        self.loop.call_soon_threadsafe(self.link.send, self.transport, data)
+
+    async def join(self, timeout=5):
+        '''asks to join until the server answers'''
+        while self.welcome is None:
+            self.send({'t': 'join'})
+            try:
+                await asyncio.wait_for(asyncio.shield(self.joined), 0.25)
+            except asyncio.TimeoutError:
+                timeout -= 0.25
+                if timeout <= 0:
+                    raise ConnectionError('no answer from server')
+        return self.welcome
+
+
+class RemoteGame(Game):
+    def __init__(self, client):
+        '''initialises a mirror of the server's game that the Tk classes can
+           observe like a Game, predicting the local player's movement'''
+        welcome = client.welcome
+        self.client = None
+        Game.__init__(self, welcome['num_cols'], welcome['num_rows'],
+                      welcome['num_players'])
+        self.client = client
+        self.local = welcome['player']
+        self.state = {}
+        self.history = {}
+        self.snapshot_seq = 0
+        self.input_seq = 0
+        self.pending = deque() #inputs the server has not applied yet
+        self.acked_keys = 0
+        self.fire_keys = {}
+        self.corrections = 0
+        self.correction_distance = 0
+
+    def new_round(self):
+        '''asks the server for a rematch, the round starts when it says so'''
+        if self.client is None:
+            Game.new_round(self)
+        else:
+            self.client.send({'t': 'rematch'})
+
+    def use_item(self, player, index):
+        '''items are picked up by the server'''
+
+    def place_bomb(self, player):
+        '''bombs are placed by the server'''
+
+    def step(self, inputs, dt=TICK):
+        '''sends the local player's keys and shows the newest snapshot,
+           predicting the local player until the server catches up'''
+        keys = inputs[self.local] if len(inputs) > self.local else inputs[0]
+        self.input_seq += 1
+        self.pending.append((self.input_seq, keys))
+        recent = list(self.pending)[-INPUT_REDUNDANCY:]
+        self.client.send({'t': 'in', 'ack': self.snapshot_seq or None,
+                          'in': [[seq, keys_to_names(k)] for seq, k in recent]})
+        applied = False
+        while self.client.snapshots:
+            applied = self.receive(self.client.snapshots.popleft()) or applied
+        player = self.players[self.local]
+        if applied:
+            x, y = player.x, player.y
+            self.reconcile()
+            self.corrections += 1
+            self.correction_distance += abs(player.x-x) + abs(player.y-y)
+        elif not player.dead and not self.round_over:
+            self.predict(player, keys, dt)
+
+    def predict(self, player, keys, dt):
+        '''moves the local player as the server will once it gets keys'''
+        self.handle_input(player, keys & ~BOMB)
+        self.move_player(player, round(SPEED*dt/TICK))
+
+    def reconcile(self):
+        '''replays the inputs the server has not applied on top of its state'''
+        player = self.players[self.local]
+        if player.dead or self.round_over:
+            return
+        player.keys = self.acked_keys
+        for seq, keys in self.pending:
+            self.predict(player, keys, TICK)
+
+    def receive(self, message):
+        '''applies a snapshot, returns whether it was new enough to use'''
+        if message['seq'] <= self.snapshot_seq:
+            return False
+        base = message['base']
+        if base is not None and base not in self.history:
+            return False
+        state = patch(self.history[base] if base else {}, message['set'], message['del'])
+        self.snapshot_seq = message['seq']
+        self.history[self.snapshot_seq] = state
+        self.history.pop(self.snapshot_seq-HISTORY, None)
+        while self.pending and self.pending[0][0] <= message['ack']:
+            self.acked_keys = self.pending.popleft()[1]
+        self.apply(state)
+        return True
+
+    def apply(self, state):
+        '''brings the mirror up to state, telling the observers what changed'''
+        old = self.state
+        self.state = state
+        round_num, round_over, winner, time = state['g']
+        self.time = time
+        if round_num != self.round_num:
+            old = self.start_round(round_num, state)
+        changed, removed = diff(old, state)
+        keys = sorted(set(changed) | set(removed), key=lambda key: 'bsdifpg'.index(key[0]))
+        for key in keys:
+            getattr(self, 'apply_'+key[0])(key, old.get(key), state.get(key))
+
+    def start_round(self, round_num, state):
+        '''resets the mirror for a round the server started, returns the
+           entries that are drawn by the new round itself'''
+        self.round_num = round_num
+        self.round_over = False
+        self.winner = None
+        self.bombs = {}
+        self.items = {}
+        self.fire_keys = {}
+        self.dying = {}
+        size = len(self.tiles.grid)
+        soft = [index for key, value in state.items() if key[0] == 's'
+                for index in decode_soft(int(key[1:]), value, size)]
+        self.tiles.reset(self.tiles.layer(SOFT_TILE, [self.tiles.cell(i) for i in soft]))
+        self.place_players()
+        self.pending.clear()
+        self.notify('new_round')
+        return {key: value for key, value in state.items() if key[0] == 's'}
+
+    def owner(self, player_number):
+        '''returns the player state with player_number'''
+        return self.players[player_number-1]
+
+    def apply_b(self, key, old, new):
+        '''a bomb was placed or went off'''
+        index = int(key[1:])
+        if old is not None:
+            bomb = self.bombs.pop(index, None)
+            self.tiles.grid[index] &= ~BOMB_TILE
+            if bomb is not None:
+                self.notify('bomb_exploded', bomb)
+        if new is not None:
+            col, row, owner = new
+            bomb = Bomb(self.owner(owner), col, row, index, 0, 0)
+            self.bombs[index] = bomb
+            self.tiles.grid[index] |= BOMB_TILE
+            self.notify('bomb_placed', bomb)
+
+    def apply_s(self, key, old, new):
+        '''soft blocks burnt away, or appeared'''
+        chunk = int(key[1:])
+        size = len(self.tiles.grid)
+        before = set(decode_soft(chunk, old, size)) if old is not None else set()
+        after = set(decode_soft(chunk, new, size)) if new is not None else set()
+        for index in sorted(before - after):
+            self.dying.pop(index, None)
+            self.tiles.grid[index] &= ~SOFT_TILE
+            self.notify('rock_removed', self.tiles.cell(index))
+        for index in sorted(after - before):
+            self.tiles.grid[index] |= SOFT_TILE
+
+    def apply_d(self, key, old, new):
+        '''a soft block started to burn'''
+        index = int(key[1:])
+        if new is None:
+            self.dying.pop(index, None)
+        elif index not in self.dying:
+            self.tiles.grid[index] |= SOFT_TILE
+            self.dying[index] = 0
+            self.notify('rock_destroyed', self.tiles.cell(index),
+                        self.players[self.local])
+
+    def apply_i(self, key, old, new):
+        '''an item was dropped, picked up or burnt'''
+        index = int(key[1:])
+        if old is not None:
+            item = self.items.pop(index, None)
+            self.tiles.grid[index] &= ~ITEM_TILE
+            if item is not None:
+                self.notify('item_removed', item, None)
+        if new is not None:
+            name, owner = new
+            col, row = self.tiles.cell(index)
+            item = Item(name, col, row, index, self.owner(owner))
+            self.items[index] = item
+            self.tiles.grid[index] |= ITEM_TILE
+            self.notify('item_dropped', item)
+
+    def apply_f(self, key, old, new):
+        '''fire started or went out'''
+        if old is not None:
+            fire = self.fire_keys.pop(key, None)
+            if fire is not None:
+                self.notify('fire_removed', fire)
+        if new is not None:
+            owner, cells = new
+            cells = [tuple(cell) for cell in cells]
+            fire = Fire(self.owner(owner), cells,
+                        [self.tiles.index(col, row) for col, row, kind in cells], 0)
+            self.fire_keys[key] = fire
+            self.notify('fire_created', fire)
+
+    def apply_p(self, key, old, new):
+        '''a player moved, died or changed'''
+        player = self.owner(int(key[1:]))
+        x, y, dead, heading, facing, power, num_bombs, points = new
+        if player.player_number-1 != self.local or dead or self.round_over:
+            player.x = x
+            player.y = y
+            player.heading = heading
+            player.v_vector = list(VECTORS[heading])
+            player.position = POSITIONS[heading]
+        else: #the local player is predicted from the server's position
+            player.x = x
+            player.y = y
+        player.col = cell_of(player.x)
+        player.row = cell_of(player.y)
+        player.facing = facing
+        player.power = power
+        player.num_bombs = num_bombs
+        player.points = points
+        if dead and not player.dead:
+            player.dead = True
+            player.position = None
+            self.num_alive -= 1
+            self.notify('player_died', player)
+
+    def apply_g(self, key, old, new):
+        '''the round ended'''
+        round_num, round_over, winner, time = new
+        if round_over and not self.round_over:
+            self.round_over = True
+            self.winner = self.owner(winner) if winner else None
+            self.notify('round_ended', self.winner)
+
+    def report(self):
+        '''returns a line describing this client's traffic and prediction'''
+        seconds = self.time/1000 or 1
+        return 'client {}: {:.2f} kB/s down, {:.2f} kB/s up, {:.2f} px average correction'.format(
+            self.local+1, self.client.bytes_received/seconds/1000,
+            self.client.bytes_sent/seconds/1000,
+            self.correction_distance/(self.corrections or 1))
+
+
+async def every(interval, function, running):
+    '''calls function every interval seconds while running() is true'''
+    loop = asyncio.get_running_loop()
+    next_time = loop.time()
+    while running():
+        function()
+        next_time += interval
+        await asyncio.sleep(max(0, next_time - loop.time()))
+
+
+async def start_server(game, host, port, link=None):
+    '''starts serving game, returns the server protocol'''
+    loop = asyncio.get_running_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: GameServer(game, link), local_addr=(host, port))
+    return server
+
+
+async def start_client(host, port, link=None):
+    '''joins the server at host, port, returns the client protocol'''
+    loop = asyncio.get_running_loop()
+    transport, client = await loop.create_datagram_endpoint(
+        lambda: GameClient(link), remote_addr=(host, port))
+    await client.join()
+    return client
+
+
+def connect(host, port, link=None, timeout=5):
+    '''joins a server from a program that is not using asyncio, such as the
+       Tk game, running the network on a background thread;
+       returns a RemoteGame holding the first snapshot'''
+    result = {}
+    ready = threading.Event()
+
+    def run():
+        async def joining():
+            try:
+                result['client'] = await start_client(host, port, link)
+            except Exception as error:
+                result['error'] = error
+            ready.set()
+            if 'client' in result:
+                await asyncio.Event().wait() #serve until the program exits
+        asyncio.run(joining())
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait(timeout+1)
+    if 'client' not in result:
+        raise result.get('error', ConnectionError('no answer from server'))
+    game = RemoteGame(result['client'])
+    waited = 0
+    while game.snapshot_seq == 0 and waited < timeout:
+        game.step([0]*len(game.players))
+        threading.Event().wait(TICK/1000)
+        waited += TICK/1000
+    return game
+
+
+async def serve(args):
+    '''runs a server until interrupted'''
+    game = Game(args.cols, args.rows, args.players, seed=args.seed)
+    link = Link(args.latency, args.jitter, args.loss)
+    server = await start_server(game, args.host, args.port, link)
+    print('serving on {}:{} for {} players'.format(args.host, args.port, args.players))
+    try:
+        await every(TICK/1000, server.tick, lambda: True)
+    finally:
+        print('\n'.join(server.report()))
+
+
+async def demo(args):
+    '''plays bots against each other over localhost and reports the traffic'''
+    game = Game(args.cols, args.rows, len(args.bots), seed=args.seed)
+    server = await start_server(game, '127.0.0.1', 0,
+                                Link(args.latency, args.jitter, args.loss, args.seed))
+    port = server.transport.get_extra_info('sockname')[1]
+    remotes = []
+    bots = []
+    for i, name in enumerate(args.bots):
+        link = Link(args.latency, args.jitter, args.loss, args.seed+i+1)
+        remote = RemoteGame(await start_client('127.0.0.1', port, link))
+        remotes.append(remote)
+        bots.append(load_bot(name)('{}-{}'.format(args.seed, i)))
+
+    def play():
+        for remote, bot in zip(remotes, bots):
+            player = remote.players[remote.local]
+            if remote.round_num != getattr(bot, 'round_num', None):
+                bot.round_num = remote.round_num
+                bot.reset(remote, player)
+            keys = [0]*len(remote.players)
+            keys[remote.local] = bot.keys(remote, player)
+            remote.step(keys)
+            if remote.round_over:
+                remote.new_round()
+
+    end = asyncio.get_running_loop().time() + args.seconds
+    running = lambda: asyncio.get_running_loop().time() < end
+    await asyncio.gather(every(TICK/1000, server.tick, running),
+                         every(TICK/1000, play, running))
+    print('\n'.join(server.report()))
+    for remote in remotes:
+        print(remote.report())
+    link = server.link
+    print('server link: {} packets sent, {} dropped'.format(link.sent, link.dropped))
+
+
+def main():
+    '''runs a server or a demo from the command line'''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mode', choices=('server', 'demo'))
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=7777)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--cols', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0, help='ms added to every packet')
+    parser.add_argument('--jitter', type=float, default=0, help='up to this many ms more')
+    parser.add_argument('--loss', type=float, default=0, help='fraction of packets dropped')
+    parser.add_argument('--bots', nargs='+', default=['random', 'random'])
+    parser.add_argument('--seconds', type=float, default=10, help='length of the demo')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args) if args.mode == 'server' else demo(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
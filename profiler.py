@@ -0,0 +1,197 @@
+"""Opt-in frame-time instrumentation for DynaBLASTER.
+   A Profiler times chosen methods by wrapping them on the objects that own
+   them, so nothing is wrapped, and nothing costs anything, unless profiling
+   was asked for. It keeps the time each subsystem took in every frame,
+   draws a histogram of frame times over the canvas and exports what it saw
+   as a Chrome trace (chrome://tracing, Perfetto) for offline analysis.
+"""
+
+from collections import deque
+from time import perf_counter
+
+import json
+
+MAX_EVENTS = 200000 #calls kept for the trace
+MAX_FRAMES = 10000 #frames kept for the histogram and the trace
+BUCKETS = (4, 8, 12, 17, 20, 25, 33, 50, 100) #upper bounds of the histogram in ms
+GAME_METHODS = (('step', 'step'), ('move_player', 'movement'),
+                ('detonate', 'destroy_blocks'), ('end_round', 'end_round'),
+                ('new_round', 'new_round'))
+
+
+class Profiler(object):
+    def __init__(self, max_events=MAX_EVENTS, max_frames=MAX_FRAMES):
+        '''initialises an empty profile'''
+        self.events = deque(maxlen=max_events) #(name, start, seconds or count)
+        self.frames = deque(maxlen=max_frames) #(end, seconds since the last, totals)
+        self.totals = {} #name -> [seconds, calls] so far this frame
+        self.counters = {} #name -> function returning a count, read every frame
+        self.counts = {} #name -> [sum, most] of the counts read
+        self.listeners = [] #called with the profiler after every frame
+        self.origin = perf_counter()
+        self.last_frame = None
+
+    def wrap(self, name, function):
+        '''returns function timed under name'''
+        events = self.events
+        totals = self.totals
+        clock = perf_counter
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                seconds = clock() - start
+                events.append((name, start, seconds))
+                total = totals.get(name)
+                if total is None:
+                    totals[name] = [seconds, 1]
+                else:
+                    total[0] += seconds
+                    total[1] += 1
+        timed.__wrapped__ = function
+        return timed
+
+    def instrument(self, owner, attr, name=None):
+        '''times every call of owner.attr from now on'''
+        setattr(owner, attr, self.wrap(name or attr, getattr(owner, attr)))
+
+    def instrument_game(self, game):
+        '''times the main subsystems of a Game'''
+        for attr, name in GAME_METHODS:
+            self.instrument(game, attr, name)
+
+    def watch(self, name, probe):
+        '''reads probe() at the end of every frame, reporting its average
+           and peak under name'''
+        self.counters[name] = probe
+        self.counts[name] = [0, 0]
+
+    def mark_frames(self, owner, attr):
+        '''ends a frame after every call of owner.attr'''
+        function = getattr(owner, attr)
+        def framed(*args, **kwargs):
+            result = function(*args, **kwargs)
+            self.end_frame()
+            return result
+        framed.__wrapped__ = function
+        setattr(owner, attr, framed)
+
+    def end_frame(self):
+        '''files what was timed since the last frame under a new frame'''
+        now = perf_counter()
+        seconds = now - self.last_frame if self.last_frame is not None else 0
+        self.last_frame = now
+        self.frames.append((now, seconds, {name: tuple(total)
+                                           for name, total in self.totals.items()}))
+        self.totals.clear()
+        for name, probe in self.counters.items():
+            count = probe()
+            total = self.counts[name]
+            total[0] += count
+            total[1] = max(total[1], count)
+            self.events.append((name, now, count))
+        for listener in self.listeners:
+            listener(self)
+
+    def histogram(self, last=None):
+        '''returns how many of the last frames took up to each of BUCKETS ms,
+           with the frames slower than all of them at the end'''
+        counts = [0]*(len(BUCKETS)+1)
+        frames = list(self.frames)[-last:] if last else self.frames
+        for end, seconds, totals in frames:
+            ms = seconds*1000
+            for i, bound in enumerate(BUCKETS):
+                if ms <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+        return counts
+
+    def summary(self):
+        '''returns lines with the cost of each subsystem per frame'''
+        seconds = {}
+        calls = {}
+        worst = {}
+        for end, interval, totals in self.frames:
+            for name, (spent, count) in totals.items():
+                seconds[name] = seconds.get(name, 0) + spent
+                calls[name] = calls.get(name, 0) + count
+                worst[name] = max(worst.get(name, 0), spent)
+        num_frames = len(self.frames) or 1
+        lines = ['{} frames, {:.2f} ms between frames at worst'.format(
+            len(self.frames), max((f[1] for f in self.frames), default=0)*1000)]
+        for name in sorted(seconds, key=seconds.get, reverse=True):
+            lines.append('{:20} {:8.3f} ms/frame {:8.3f} ms worst {:8.1f} calls/frame'.format(
+                name, seconds[name]/num_frames*1000, worst[name]*1000,
+                calls[name]/num_frames))
+        for name, (total, most) in self.counts.items():
+            lines.append('{:20} {:8.1f} average  {:8} at most'.format(
+                name, total/num_frames, most))
+        return lines
+
+    def trace(self):
+        '''returns the profile as a Chrome trace'''
+        origin = self.origin
+        counters = self.counters
+        events = [{'name': name, 'ph': 'C', 'pid': 1, 'tid': 1,
+                   'ts': (start-origin)*1e6, 'args': {name: value}}
+                  if name in counters else
+                  {'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                   'ts': (start-origin)*1e6, 'dur': value*1e6}
+                  for name, start, value in self.events]
+        for end, seconds, totals in self.frames:
+            events.append({'name': 'frame', 'ph': 'C', 'pid': 1, 'tid': 1,
+                           'ts': (end-origin)*1e6, 'args': {'ms': seconds*1000}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'histogram': dict(zip([str(bound) for bound in BUCKETS]+['more'],
+                                      self.histogram()))}
+
+    def export(self, path):
+        '''writes the profile to path as a Chrome trace'''
+        with open(path, 'w') as trace_file:
+            json.dump(self.trace(), trace_file)
+
+
+class FrameOverlay(object):
+    def __init__(self, canvas, profiler, every=30, last=300):
+        '''draws a histogram of the last frame times over the top left of the
+           canvas, redrawn every few frames'''
+        self.canvas = canvas
+        self.every = every
+        self.last = last
+        self.count = 0
+        self.background = canvas.create_rectangle(0, 0, 0, 0, fill='black',
+                                                  outline='', stipple='gray50')
+        self.bars = [canvas.create_rectangle(0, 0, 0, 0, fill='#3c3', width=0)
+                     for i in range(len(BUCKETS)+1)]
+        self.text = canvas.create_text(0, 0, anchor='nw', fill='white',
+                                       font=('TkFixedFont', 8))
+        profiler.listeners.append(self.on_frame)
+
+    def on_frame(self, profiler):
+        '''redraws the histogram every few frames'''
+        self.count += 1
+        if self.count % self.every:
+            return
+        canvas = self.canvas
+        counts = profiler.histogram(self.last)
+        left = canvas.canvasx(0)+4
+        top = canvas.canvasy(0)+4
+        width, height = 12, 40
+        canvas.coords(self.background, left, top, left+len(counts)*width+4, top+height+16)
+        most = max(counts) or 1
+        for i, (bar, count) in enumerate(zip(self.bars, counts)):
+            x = left+2+i*width
+            slow = i > BUCKETS.index(17)
+            canvas.coords(bar, x, top+height-height*count/most, x+width-2, top+height)
+            canvas.itemconfig(bar, fill='#c33' if slow else '#3c3')
+        frames = list(profiler.frames)[-self.last:]
+        worst = max(frame[1] for frame in frames)*1000
+        canvas.coords(self.text, left+2, top+height+2)
+        canvas.itemconfig(self.text, text='worst {:.0f} ms'.format(worst))
+        canvas.tag_raise(self.background)
+        for bar in self.bars:
+            canvas.tag_raise(bar)
+        canvas.tag_raise(self.text)
@@ -0,0 +1,137 @@
+"""Dirty-tracking render layer for DynaBLASTER.
+   Sprites record what they want to look like here, and once per frame only
+   the items whose position, image or state really changed are sent to the
+   Canvas, one coords and one itemconfig call per item at most.
+
+   Short-lived sprites such as bombs, fire, items and blocks come from pools
+   of image items that are created once and hidden when let go, so setting
+   off a bomb or starting a round only moves and reconfigures existing items.
+"""
+
+
+class RenderLayer(object):
+    def __init__(self, canvas):
+        '''initialises the layer on top of canvas'''
+        self.canvas = canvas
+        self.shown = {} #item -> options as last sent to Tk
+        self.pending = {} #item -> options to send on the next flush
+        self.calls = 0 #Tk calls made so far this frame
+        self.frame_calls = 0 #Tk calls made during the last frame
+        self.pools = {} #kind of sprite -> ItemPool
+
+    def create_image(self, x, y, **options):
+        '''creates an image item straight away and returns it'''
+        item = self.canvas.create_image(x, y, **options)
+        self.calls += 1
+        options['coords'] = (x, y)
+        self.shown[item] = options
+        return item
+
+    def delete(self, item):
+        '''deletes an item straight away'''
+        self.canvas.delete(item)
+        self.calls += 1
+        self.shown.pop(item, None)
+        self.pending.pop(item, None)
+
+    def tag_raise(self, item, above=None):
+        '''raises an item above the others, or just above another item,
+           straight away'''
+        if above is None:
+            self.canvas.tag_raise(item)
+        else:
+            self.canvas.tag_raise(item, above)
+        self.calls += 1
+
+    def pool(self, kind, size=1):
+        '''returns the pool of items for sprites of a kind, creating it with
+           size items the first time, pools being stacked in the order they
+           are first asked for'''
+        pool = self.pools.get(kind)
+        if pool is None:
+            pool = self.pools[kind] = ItemPool(self, kind, size)
+        return pool
+
+    def pool_stats(self):
+        '''returns the counters of every pool by kind'''
+        return {kind: pool.stats() for kind, pool in self.pools.items()}
+
+    def move_to(self, item, x, y):
+        '''moves an item to x, y on the next flush'''
+        self.configure(item, coords=(x, y))
+
+    def configure(self, item, **options):
+        '''changes the options of an item on the next flush'''
+        shown = self.shown.setdefault(item, {})
+        pending = self.pending.get(item)
+        for key, value in options.items():
+            if shown.get(key) != value:
+                if pending is None:
+                    pending = self.pending[item] = {}
+                pending[key] = value
+            elif pending is not None:
+                pending.pop(key, None)
+
+    def flush(self):
+        '''sends every real change to the canvas and starts a new frame,
+           returns the number of Tk calls made during the frame'''
+        canvas = self.canvas
+        for item, options in self.pending.items():
+            shown = self.shown[item]
+            shown.update(options)
+            coords = options.pop('coords', None)
+            if coords is not None:
+                canvas.coords(item, *coords)
+                self.calls += 1
+            if options:
+                canvas.itemconfig(item, **options)
+                self.calls += 1
+        self.pending.clear()
+        self.frame_calls = self.calls
+        self.calls = 0
+        return self.frame_calls
+
+
+class ItemPool(object):
+    def __init__(self, render, kind, size=1):
+        '''initialises a pool of hidden image items with size of them
+           created straight away'''
+        self.render = render
+        self.kind = kind
+        self.free = []
+        self.top = None #the item stacked highest, new ones going above it
+        self.size = 0
+        self.in_use = 0
+        self.high_water = 0 #most items in use at once
+        for i in range(size):
+            self.free.append(self.create())
+
+    def create(self):
+        '''creates a hidden item, stacked with the rest of the pool'''
+        item = self.render.create_image(0, 0, state='hidden')
+        if self.top is not None:
+            self.render.tag_raise(item, self.top)
+        self.top = item
+        self.size += 1
+        return item
+
+    def acquire(self, x, y, image):
+        '''returns an item showing image at x, y, reusing a free one
+           when there is one'''
+        item = self.free.pop() if self.free else self.create()
+        self.render.configure(item, coords=(x, y), image=image, state='normal')
+        self.in_use += 1
+        if self.in_use > self.high_water:
+            self.high_water = self.in_use
+        return item
+
+    def release(self, item):
+        '''hides an item and gives it back to the pool'''
+        self.render.configure(item, state='hidden')
+        self.free.append(item)
+        self.in_use -= 1
+
+    def stats(self):
+        '''returns the counters of the pool'''
+        return {'size': self.size, 'in_use': self.in_use,
+                'high_water': self.high_water}
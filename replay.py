@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+
+"""Deterministic replays for DynaBLASTER.
+   A round is fully decided by the game's settings, its seed and what keys
+   each player held on each tick, so a replay stores only those: a small
+   header and a log of (tick, player, keys) whenever a player's keys change.
+   A round whose soft blocks came from a map library also keeps its layout.
+
+       python3 replay.py round.dbr                play headless at full speed
+       python3 replay.py round.dbr --profile      ...under cProfile
+       python3 replay.py round.dbr --trace t.json ...writing a Chrome trace
+       python3 DynaBLASTER.py --replay round.dbr --speed 2 --start 600
+"""
+
+from engine import Game, Observers, TICK
+from profiler import Profiler
+from copy import deepcopy
+from time import perf_counter
+
+import argparse
+import struct
+
+MAGIC = b'DBRP'
+VERSION = 2
+VERSIONS = (1, 2) #version 1 replays have no layout
+HEADER = struct.Struct('<4sBHHBBqIdII')
+EVENT = struct.Struct('<IBB') #tick, player, keys
+LAYOUT = struct.Struct('<I') #bytes of soft block layout that follow
+KEYFRAME_EVERY = 600 #ticks
+
+
+def copy_game(game):
+    '''returns a copy of game that nothing observes'''
+    observers, recorder = game.observers, game.recorder
+    game.observers, game.recorder = Observers(), None
+    try:
+        return deepcopy(game)
+    finally:
+        game.observers, game.recorder = observers, recorder
+
+
+class Replay(object):
+    def __init__(self, num_cols, num_rows, num_players, drop_chance, seed,
+                 round_num, dt=TICK, ticks=0, events=None, layout=None):
+        '''initialises the replay of round round_num of a game, layout being
+           its soft blocks when they were drawn from a map library'''
+        self.num_cols = num_cols
+        self.num_rows = num_rows
+        self.num_players = num_players
+        self.drop_chance = drop_chance
+        self.seed = seed
+        self.round_num = round_num
+        self.dt = dt
+        self.ticks = ticks
+        self.events = events if events is not None else []
+        self.layout = layout
+        self.keyframes = []
+
+    @classmethod
+    def of(cls, game):
+        '''returns an empty replay of the round game is playing'''
+        return cls(game.num_cols, game.num_rows, len(game.players),
+                   game.drop_chance, game.seed, game.round_num,
+                   layout=game.layout if game.maps else None)
+
+    def save(self, path):
+        '''writes the replay to path'''
+        with open(path, 'wb') as replay_file:
+            replay_file.write(HEADER.pack(
+                MAGIC, VERSION, self.num_cols, self.num_rows, self.num_players,
+                self.drop_chance, self.seed, self.round_num, self.dt,
+                self.ticks, len(self.events)))
+            for event in self.events:
+                replay_file.write(EVENT.pack(*event))
+            if self.layout is None:
+                replay_file.write(LAYOUT.pack(0))
+            else:
+                size = (self.num_cols*2+1)*(self.num_rows*2+1)
+                replay_file.write(LAYOUT.pack(size))
+                replay_file.write(self.layout.to_bytes(size, 'little'))
+
+    @classmethod
+    def load(cls, path):
+        '''reads a replay written by save'''
+        with open(path, 'rb') as replay_file:
+            data = replay_file.read()
+        (magic, version, num_cols, num_rows, num_players, drop_chance, seed,
+         round_num, dt, ticks, num_events) = HEADER.unpack_from(data)
+        if magic != MAGIC or version not in VERSIONS:
+            raise ValueError(path+' is not a version {} replay'.format(VERSION))
+        offset = HEADER.size+num_events*EVENT.size
+        events = list(EVENT.iter_unpack(data[HEADER.size:offset]))
+        layout = None
+        if version >= 2:
+            size, = LAYOUT.unpack_from(data, offset)
+            offset += LAYOUT.size
+            if size:
+                layout = int.from_bytes(data[offset:offset+size], 'little')
+        return cls(num_cols, num_rows, num_players, drop_chance, seed,
+                   round_num, dt, ticks, events, layout)
+
+    def new_game(self):
+        '''returns a game at the start of the recorded round'''
+        game = Game(self.num_cols, self.num_rows, self.num_players,
+                    seed=self.seed, drop_chance=self.drop_chance,
+                    maps=None if self.layout is None else [self.layout])
+        if self.round_num != game.round_num:
+            game.round_num = self.round_num-1
+            game.new_round()
+        return game
+
+    def inputs(self, keys=None, cursor=0, tick=0):
+        '''yields the keys of every player for each tick from tick on,
+           keys and cursor being the state of the log at that tick'''
+        keys = list(keys or [0]*self.num_players)
+        events = self.events
+        while tick < self.ticks:
+            while cursor < len(events) and events[cursor][0] <= tick:
+                keys[events[cursor][1]] = events[cursor][2]
+                cursor += 1
+            yield list(keys)
+            tick += 1
+
+    def build_keyframes(self, every=KEYFRAME_EVERY):
+        '''plays the round headless, keeping a copy of the game every few ticks'''
+        self.keyframes = []
+        game = self.new_game()
+        keys = [0]*self.num_players
+        cursor = 0
+        events = self.events
+        for tick in range(self.ticks):
+            if tick % every == 0:
+                self.keyframes.append((tick, copy_game(game), list(keys), cursor))
+            while cursor < len(events) and events[cursor][0] <= tick:
+                keys[events[cursor][1]] = events[cursor][2]
+                cursor += 1
+            game.step(keys, self.dt)
+        return game
+
+    def start(self, tick=0):
+        '''returns the game at tick and an iterator of the inputs after it,
+           starting from the nearest keyframe'''
+        keyframe = None
+        for frame in self.keyframes:
+            if frame[0] > tick:
+                break
+            keyframe = frame
+        if keyframe is None:
+            game = self.new_game()
+            inputs = self.inputs()
+            at = 0
+        else:
+            at, game, keys, cursor = keyframe
+            game = copy_game(game)
+            inputs = self.inputs(keys, cursor, at)
+        for i in range(min(tick, self.ticks) - at):
+            game.step(next(inputs), self.dt)
+        return game, inputs
+
+    def play(self, tick=None):
+        '''plays the round headless as fast as possible up to tick,
+           returns the game'''
+        game, inputs = self.start()
+        for i, keys in enumerate(inputs):
+            if tick is not None and i >= tick:
+                break
+            game.step(keys, self.dt)
+        return game
+
+
+class Recorder(object):
+    def __init__(self, game, path=None):
+        '''records every round game plays; when path is given, each round is
+           saved there once it ends, with {round} replaced by the round number'''
+        self.game = game
+        self.path = path
+        game.recorder = self
+        game.observers.append(self)
+        self.keys = [0]*len(game.players)
+        self.replay = None
+        if game.tick == 0:
+            self.on_new_round()
+        #a round joined midway, e.g. resumed from a snapshot, cannot be
+        #replayed from its start, so recording starts with the next one
+
+    def on_new_round(self):
+        '''starts a new replay'''
+        self.replay = Replay.of(self.game)
+        self.keys = [0]*len(self.game.players)
+
+    def on_restored(self):
+        '''rolls the replay back to the tick the game was restored to, or
+           drops it when the game went back to a round it does not hold'''
+        game = self.game
+        replay = self.replay
+        if replay is None or (replay.seed, replay.round_num) != \
+           (game.seed, game.round_num) or game.tick > replay.ticks:
+            self.replay = None
+            return
+        replay.events = [event for event in replay.events if event[0] < game.tick]
+        replay.ticks = game.tick
+        self.keys = [0]*len(game.players)
+        for tick, player, keys in replay.events:
+            self.keys[player] = keys
+
+    def on_round_ended(self, winner):
+        '''saves the replay of the round that ended'''
+        if self.path is not None and self.replay is not None:
+            self.save(self.path.format(round=self.game.round_num))
+
+    def record(self, tick, inputs):
+        '''logs the players whose keys changed this tick'''
+        if self.replay is None:
+            return
+        for player, keys in enumerate(inputs):
+            if keys != self.keys[player]:
+                self.replay.events.append((tick, player, keys))
+                self.keys[player] = keys
+        self.replay.ticks = tick+1
+
+    def save(self, path):
+        '''writes the replay of the current round to path'''
+        self.replay.save(path)
+
+
+def describe(game):
+    '''returns a line describing how a round ended'''
+    if not game.round_over:
+        result = 'unfinished'
+    elif game.winner is None:
+        result = 'draw'
+    else:
+        result = 'player {} wins'.format(game.winner.player_number)
+    return 'tick {}, {:.2f}s of play: {}'.format(game.tick, game.time/1000, result)
+
+
+def main():
+    '''plays a replay headless from the command line'''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('replay')
+    parser.add_argument('--seek', type=int, help='stop at this tick')
+    parser.add_argument('--repeat', type=int, default=1, help='play it this many times')
+    parser.add_argument('--profile', action='store_true', help='play under cProfile')
+    parser.add_argument('--trace', metavar='PATH',
+                        help='time each tick and write a Chrome trace to PATH')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    print('round {} of seed {}, {} ticks, {} input changes'.format(
+        replay.round_num, replay.seed, replay.ticks, len(replay.events)))
+
+    def play():
+        for i in range(args.repeat):
+            game = replay.play(args.seek)
+        return game
+    if args.trace:
+        profiler = Profiler()
+        new_game = replay.new_game
+        def traced_game():
+            game = new_game()
+            profiler.instrument_game(game)
+            profiler.mark_frames(game, 'step')
+            profiler.watch('timers', game.pending)
+            return game
+        replay.new_game = traced_game
+    start = perf_counter()
+    if args.profile:
+        import cProfile
+        profile = cProfile.Profile()
+        game = profile.runcall(play)
+        profile.print_stats('cumulative')
+    else:
+        game = play()
+    elapsed = perf_counter() - start
+    if args.trace:
+        profiler.export(args.trace)
+        print('\n'.join(profiler.summary()))
+    print(describe(game))
+    print('{} ticks in {:.3f}s ({:.0f} ticks/s)'.format(
+        game.tick*args.repeat, elapsed, game.tick*args.repeat/elapsed))
+
+
+if __name__ == '__main__':
+    main()
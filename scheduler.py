@@ -0,0 +1,47 @@
+"""Game loop timing for DynaBLASTER.
+   The game runs from a single Tk callback that asks FixedTimestep how many
+   fixed simulation steps the monotonic clock says are due, so the game plays
+   at the same speed however often the callback runs.
+"""
+
+from time import perf_counter
+
+MAX_STEPS = 5 #simulation steps a frame may run to catch up
+
+
+class FixedTimestep(object):
+    def __init__(self, step, max_steps=MAX_STEPS, clock=perf_counter):
+        '''initialises a loop that runs a simulation step every step ms of
+           real time, however often it is asked'''
+        self.step = step
+        self.max_steps = max_steps
+        self.clock = clock #monotonic, in seconds
+        self.last = None
+        self.lag = 0 #ms of real time not simulated yet
+        self.dropped = 0 #ms given up on when too far behind
+        self.paused = False #the game loop only draws while set
+
+    @property
+    def alpha(self):
+        '''how far the next step has got, for drawing between two steps'''
+        return self.lag/self.step
+
+    def advance(self, scale=1):
+        '''returns the number of steps due by the ms that passed since the
+           last call, times scale; when more than max_steps are due the rest
+           is dropped, slowing the game down rather than spiralling'''
+        now = self.clock()*1000
+        elapsed = (now - self.last)*scale if self.last is not None else 0
+        self.last = now
+        self.lag += elapsed
+        steps = int(self.lag // self.step)
+        if steps > self.max_steps:
+            self.dropped += (steps - self.max_steps)*self.step
+            steps = self.max_steps
+        self.lag = min(self.lag - steps*self.step, self.step)
+        return steps
+
+    def reset(self):
+        '''forgets the time that passed, e.g. while paused'''
+        self.last = None
+        self.lag = 0
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+"""Binary snapshots of a DynaBLASTER game.
+   A snapshot holds everything a round needs to carry on as if it had never
+   stopped: the tile grid and the soft blocks the round started with, the
+   players, the bombs and the time left on their fuses, the fire, the items,
+   the soft blocks being destroyed and the state of the round's random
+   numbers. What can be worked out again, such
+   as the cells that are burning or who stands where, is left out.
+
+   save(game) returns the snapshot as bytes and restore(game, data) puts a
+   game of the same size back in that state, e.g. to resume a saved game, to
+   roll back or to set a round up for a test without replaying its inputs.
+"""
+
+from array import array
+from collections import deque
+from engine import Game, Bomb, Fire, Item, ITEMS, RAYS, VECTORS, cell_of
+from time import perf_counter
+
+import argparse
+import math
+import struct
+
+MAGIC = b'DBSS'
+VERSION = 2
+VERSIONS = (1, 2) #version 1 snapshots have no layout
+#magic, version, lanes across and down, players, item drop chance, seed,
+#round, tick, time, travel, round over, end time, winner, then how many
+#bombs, fires, items and dying soft blocks follow, and the random gauss;
+#the random state, the grid and, from version 2, the round's layout follow
+HEADER = struct.Struct('<4sBHHBBqIIddBdBIIIId')
+#x, y, keys, heading, position, facing, dead, power, bombs, bombs placed,
+#bombs dropped, items picked, points
+PLAYER = struct.Struct('<iiBBBBBHHHHHH')
+BOMB = struct.Struct('<IBHd') #position, owner, power, deadline
+FIRE = struct.Struct('<BdH') #owner, deadline, cells
+ITEM = struct.Struct('<IBB') #position, kind, owner
+DYING = struct.Struct('<Id') #position, deadline
+STATE_SIZE = 625 #words of the random number generator's state
+FACES = ('forw', 'back', 'left', 'right')
+FIRE_KINDS = ('mid',)+tuple(sorted({kind for ray in RAYS for kind in ray[2:]}))
+NONE = float('nan') #stands for a missing time
+
+
+def save(game):
+    '''returns the state of game as a snapshot'''
+    version, state, gauss = game.random.getstate()
+    parts = [HEADER.pack(
+        MAGIC, VERSION, game.num_cols, game.num_rows, len(game.players),
+        game.drop_chance, game.seed, game.round_num, game.tick, game.time,
+        game.travel, game.round_over,
+        NONE if game.end_time is None else game.end_time,
+        game.winner.player_number if game.winner else 0,
+        len(game.bombs), len(game.fires), len(game.items), len(game.dying),
+        NONE if gauss is None else gauss)]
+    parts.append(array('I', state).tobytes())
+    parts.append(bytes(game.tiles.grid))
+    parts.append(game.layout.to_bytes(len(game.tiles.grid), 'little'))
+    for player in game.players:
+        parts.append(PLAYER.pack(
+            player.x, player.y, player.keys, player.heading,
+            FACES.index(player.position)+1 if player.position else 0,
+            FACES.index(player.facing), player.dead, player.power,
+            player.num_bombs, player.bombs_placed, player.bombs_dropped,
+            player.items_picked, player.points))
+    for bomb in game.bombs.values(): #in the order they go off
+        parts.append(BOMB.pack(bomb.index, bomb.owner.player_number, bomb.power,
+                               bomb.deadline))
+    for fire in game.fires:
+        parts.append(FIRE.pack(fire.owner.player_number, fire.deadline,
+                               len(fire.indices)))
+        parts.append(array('I', fire.indices).tobytes())
+        parts.append(bytes(FIRE_KINDS.index(kind) for col, row, kind in fire.cells))
+    for item in game.items.values():
+        parts.append(ITEM.pack(item.index, ITEMS.index(item.name),
+                               item.owner.player_number))
+    for index, deadline in game.dying.items():
+        parts.append(DYING.pack(index, deadline))
+    return b''.join(parts)
+
+
+def read_header(data):
+    '''returns the header of a snapshot, checking it is one'''
+    header = HEADER.unpack_from(data)
+    if header[0] != MAGIC or header[1] not in VERSIONS:
+        raise ValueError('not a version {} snapshot'.format(VERSION))
+    return header
+
+
+def restore(game, data):
+    '''puts game back in the state saved in a snapshot of a game of its size'''
+    (magic, version, num_cols, num_rows, num_players, drop_chance, seed,
+     round_num, tick, time, travel, round_over, end_time, winner, num_bombs,
+     num_fires, num_items, num_dying, gauss) = read_header(data)
+    if (num_cols, num_rows, num_players) != \
+       (game.num_cols, game.num_rows, len(game.players)):
+        raise ValueError('the snapshot is of a {}x{} game for {} players'.format(
+            num_cols, num_rows, num_players))
+    offset = HEADER.size
+    state = array('I')
+    state.frombytes(data[offset:offset+STATE_SIZE*4])
+    offset += STATE_SIZE*4
+    game.random.setstate((3, tuple(state), None if math.isnan(gauss) else gauss))
+    game.drop_chance = drop_chance
+    game.seed = seed
+    game.round_num = round_num
+    game.tick = tick
+    game.time = time
+    game.travel = travel
+    game.round_over = bool(round_over)
+    game.end_time = None if math.isnan(end_time) else end_time
+    game.winner = game.players[winner-1] if winner else None
+
+    tiles = game.tiles
+    size = len(tiles.grid)
+    tiles.grid[:] = data[offset:offset+size]
+    offset += size
+    if version >= 2: #replays of the round need the layout it started with
+        game.layout = int.from_bytes(data[offset:offset+size], 'little')
+        offset += size
+
+    players = game.players
+    game.occupants = occupants = {}
+    game.num_alive = 0
+    for player, fields in zip(players, PLAYER.iter_unpack(
+            data[offset:offset+num_players*PLAYER.size])):
+        (player.x, player.y, player.keys, player.heading, position, facing, dead,
+         player.power, player.num_bombs, player.bombs_placed, player.bombs_dropped,
+         player.items_picked, player.points) = fields
+        player.position = FACES[position-1] if position else None
+        player.facing = FACES[facing]
+        player.dead = bool(dead)
+        player.v_vector = list(VECTORS[player.heading])
+        player.col = cell_of(player.x)
+        player.row = cell_of(player.y)
+        player.index = tiles.index(player.col, player.row)
+        occupants.setdefault(player.index, []).append(player)
+        game.num_alive += not dead
+    offset += num_players*PLAYER.size
+
+    game.bombs = bombs = {}
+    for index, owner, power, deadline in BOMB.iter_unpack(
+            data[offset:offset+num_bombs*BOMB.size]):
+        col, row = tiles.cell(index)
+        bombs[index] = Bomb(players[owner-1], col, row, index, power, deadline)
+    offset += num_bombs*BOMB.size
+
+    game.fires = fires = deque()
+    game.burning = burning = array('H', [0])*size
+    for i in range(num_fires):
+        owner, deadline, count = FIRE.unpack_from(data, offset)
+        offset += FIRE.size
+        indices = array('I')
+        indices.frombytes(data[offset:offset+count*4])
+        offset += count*4
+        kinds = data[offset:offset+count]
+        offset += count
+        cells = []
+        for index, kind in zip(indices, kinds):
+            burning[index] += 1
+            cells.append(tiles.cell(index)+(FIRE_KINDS[kind],))
+        fires.append(Fire(players[owner-1], cells, list(indices), deadline))
+
+    game.items = items = {}
+    for index, kind, owner in ITEM.iter_unpack(data[offset:offset+num_items*ITEM.size]):
+        col, row = tiles.cell(index)
+        items[index] = Item(ITEMS[kind], col, row, index, players[owner-1])
+    offset += num_items*ITEM.size
+
+    game.dying = dict(DYING.iter_unpack(data[offset:offset+num_dying*DYING.size]))
+    game.notify('restored')
+
+
+def load(data):
+    '''returns a new game in the state saved in a snapshot'''
+    header = read_header(data)
+    game = Game(header[2], header[3], header[4], seed=header[6],
+                drop_chance=header[5])
+    restore(game, data)
+    return game
+
+
+def main():
+    '''times saving and restoring a round played by bots halfway through'''
+    from bots import load_bot
+    parser = argparse.ArgumentParser(description='times snapshots of a round')
+    parser.add_argument('--cols', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--players', type=int, default=2)
+    parser.add_argument('--bot', default='random')
+    parser.add_argument('--ticks', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=1000)
+    args = parser.parse_args()
+
+    game = Game(args.cols, args.rows, args.players, seed=0)
+    bots = [load_bot(args.bot)(i) for i in range(args.players)]
+    for bot, player in zip(bots, game.players):
+        bot.reset(game, player)
+    for tick in range(args.ticks):
+        game.step([bot.keys(game, player) for bot, player in zip(bots, game.players)])
+    start = perf_counter()
+    for i in range(args.repeat):
+        data = save(game)
+    saving = (perf_counter()-start)/args.repeat
+    start = perf_counter()
+    for i in range(args.repeat):
+        restore(game, data)
+    restoring = (perf_counter()-start)/args.repeat
+    print('{} bytes, {:.1f} us to save, {:.1f} us to restore'.format(
+        len(data), saving*1e6, restoring*1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""Soak tests for DynaBLASTER.
+   Plays round after round with bots and, at the start of each new round,
+   samples everything that could pile up over days of running: the memory
+   Python has allocated, traced with tracemalloc, and whatever counters the
+   probes report, such as canvas items or pending timers. Once the game has
+   warmed up none of them should keep growing; those that do are reported
+   and the soak fails.
+
+       python3 soak.py --rounds 2000          the engine and bots alone
+       python3 DynaBLASTER.py --soak 2000     ...with the Tk game drawing them
+"""
+
+from engine import Game
+from bots import load_bot
+from tournament import play_round
+from time import perf_counter
+
+import argparse
+import sys
+import tracemalloc
+
+WARMUP = 20 #rounds left out before looking for growth
+MEMORY_SLACK = 256*1024 #bytes memory may grow by without counting as a leak
+MAX_ROUND_TIME = 180000 #ms of play before a round is called a draw
+
+
+class Soak(object):
+    def __init__(self, probes, warmup=WARMUP):
+        '''initialises a soak test of the counters returned by probes, a
+           dict of name -> function, and of the memory allocated'''
+        self.probes = probes
+        self.warmup = warmup
+        self.slack = {'memory': MEMORY_SLACK}
+        self.samples = {name: [] for name in ['memory']+list(probes)}
+        self.rounds = 0
+
+    def start(self):
+        '''starts tracing memory allocations'''
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def stop(self):
+        '''stops tracing memory allocations'''
+        tracemalloc.stop()
+
+    def sample(self):
+        '''records every counter as it is now, once a round'''
+        self.rounds += 1
+        self.samples['memory'].append(tracemalloc.get_traced_memory()[0])
+        for name, probe in self.probes.items():
+            self.samples[name].append(probe())
+
+    def line(self):
+        '''returns a line describing the last sample'''
+        memory = self.samples['memory']
+        parts = ['round {}: memory {:+.1f} kB'.format(
+            self.rounds, (memory[-1]-memory[min(self.warmup, len(memory)-1)])/1024)]
+        for name in self.probes:
+            parts.append('{} {}'.format(name, self.samples[name][-1]))
+        return ', '.join(parts)
+
+    def growing(self):
+        '''returns the counters that trend upward once warmed up: those
+           higher in the last third of the rounds than in the first, at
+           their medians, by more than their slack'''
+        found = []
+        for name, values in self.samples.items():
+            values = values[self.warmup:]
+            third = len(values)//3
+            if not third:
+                continue
+            before = sorted(values[:third])[third//2]
+            after = sorted(values[-third:])[third//2]
+            if after-before > self.slack.get(name, 0):
+                found.append(name)
+        return found
+
+    def report(self):
+        '''returns lines summing the soak test up'''
+        lines = []
+        for name, values in self.samples.items():
+            values = values[self.warmup:] or values
+            if values:
+                lines.append('{:20} first {:>10} last {:>10} highest {:>10}'.format(
+                    name, values[0], values[-1], max(values)))
+        growing = self.growing()
+        if growing:
+            lines.append('growing: '+', '.join(growing))
+        elif self.rounds <= self.warmup:
+            lines.append('too few rounds to tell, {} are warm-up'.format(self.warmup))
+        else:
+            lines.append('nothing grew over {} rounds'.format(self.rounds))
+        return lines
+
+
+def main():
+    '''soaks the engine and bots from the command line, exiting with 1 when
+       something grows'''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=1000)
+    parser.add_argument('--every', type=int, default=1, help='rounds between reports')
+    parser.add_argument('--cols', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bots', nargs='+', default=['smart', 'smart'])
+    args = parser.parse_args()
+
+    game = Game(args.cols, args.rows, len(args.bots), seed=args.seed)
+    bots = [load_bot(name)('{}-{}'.format(args.seed, i)) for i, name in enumerate(args.bots)]
+    soak = Soak({'observers': lambda: len(game.observers),
+                 'entities': lambda: len(game.bombs)+len(game.fires)+
+                                     len(game.items)+len(game.dying),
+                 'occupied cells': lambda: len(game.occupants)})
+    soak.start()
+    start = perf_counter()
+    for i in range(args.rounds):
+        play_round(game, bots, MAX_ROUND_TIME)
+        game.new_round()
+        soak.sample()
+        if soak.rounds % args.every == 0:
+            print(soak.line())
+    soak.stop()
+    print('{} rounds in {:.1f}s'.format(args.rounds, perf_counter()-start))
+    print('\n'.join(soak.report()))
+    sys.exit(1 if soak.growing() else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+"""Spectator broadcasts of DynaBLASTER.
+   The game being played encodes its state once per tick, as a delta against
+   the tick before or, every KEYFRAME_EVERY ticks, in full. The delta is made
+   of the entries the game's events touched, so the board is never rescanned
+   after the start of a round, and an asyncio TCP
+   server sends those same bytes to every viewer. Encoding costs the same
+   however many people watch. A viewer that cannot keep up is not waited for:
+   the frames it has no room for are dropped and it picks up again at the
+   next keyframe. Viewers draw the game with the usual sprites.
+
+       python3 DynaBLASTER.py --broadcast 7778
+       python3 DynaBLASTER.py --watch localhost:7778
+       python3 spectate.py demo --viewers 100 --slow 5
+
+   demo broadcasts bots playing to local viewers, some of them slow, and
+   reports the cost of encoding and sending each tick.
+"""
+
+from engine import Game, TICK
+from netplay import (RemoteGame, encode, encode_player, encode_fire, encode_soft,
+                     fire_key, diff, patch, SOFT_CHUNK)
+from bots import load_bot
+from collections import deque
+from time import perf_counter
+
+import argparse
+import asyncio
+import json
+import socket
+import struct
+import threading
+
+KEYFRAME_EVERY = 60 #ticks between full states
+MAX_BUFFERED = 16*1024 #bytes queued for a viewer before it skips frames
+SEND_BUFFER = 16*1024 #bytes the system buffers for each viewer
+FRAME = struct.Struct('<IBI') #length of what follows, kind, tick
+DELTA, KEYFRAME, HELLO = range(3)
+
+
+def pack(kind, tick, message):
+    '''returns a frame holding message'''
+    data = json.dumps(message, separators=(',', ':')).encode()
+    return FRAME.pack(len(data), kind, tick) + data
+
+
+class Viewer(object):
+    def __init__(self, writer):
+        '''initialises the broadcaster's record of a connected viewer'''
+        self.writer = writer
+        self.waiting = True #for a keyframe to start from
+        self.frames_sent = 0
+        self.frames_skipped = 0
+        self.bytes_sent = 0
+
+
+class Broadcaster(object):
+    def __init__(self, game, keyframe_every=KEYFRAME_EVERY):
+        '''initialises a broadcast of game, nobody watching yet'''
+        self.game = game
+        self.keyframe_every = keyframe_every
+        self.hello = pack(HELLO, 0, {'num_cols': game.num_cols,
+                                     'num_rows': game.num_rows,
+                                     'num_players': len(game.players)})
+        self.viewers = []
+        self.state = {}
+        self.touched = set() #keys of the entries changed since the last frame
+        self.dirty = set() #soft block chunks changed since the last frame
+        self.ticks = 0
+        self.encode_time = 0
+        self.send_time = 0
+        self.bytes_encoded = 0
+        self.loop = None
+
+    def attach(self):
+        '''broadcasts a frame after every step of the game'''
+        self.rebuild()
+        self.game.observers.append(self)
+        step = self.game.step
+        def stepped(*args, **kwargs):
+            step(*args, **kwargs)
+            self.publish()
+        stepped.__wrapped__ = step
+        self.game.step = stepped
+
+    def rebuild(self):
+        '''encodes the whole game again, when a round starts or is restored'''
+        old = self.state
+        self.state = encode(self.game)
+        changed, removed = diff(old, self.state)
+        self.touched.update(changed, removed)
+        self.dirty.clear()
+
+    def put(self, key, value):
+        '''sets an entry of the state'''
+        self.state[key] = value
+        self.touched.add(key)
+
+    def drop(self, key):
+        '''removes an entry of the state'''
+        self.state.pop(key, None)
+        self.touched.add(key)
+
+    def on_new_round(self):
+        self.rebuild()
+
+    def on_restored(self):
+        self.rebuild()
+
+    def on_bomb_placed(self, bomb):
+        self.put('b'+str(bomb.index), [bomb.col, bomb.row, bomb.owner.player_number])
+
+    def on_bomb_exploded(self, bomb):
+        self.drop('b'+str(bomb.index))
+
+    def on_item_dropped(self, item):
+        self.put('i'+str(item.index), [item.name, item.owner.player_number])
+
+    def on_item_removed(self, item, player):
+        self.drop('i'+str(item.index))
+
+    def on_fire_created(self, fire):
+        self.put(fire_key(fire), encode_fire(fire))
+
+    def on_fire_removed(self, fire):
+        self.drop(fire_key(fire))
+
+    def on_rock_destroyed(self, cell, owner):
+        self.put('d'+str(self.game.tiles.index(*cell)), 1)
+
+    def on_rock_removed(self, cell):
+        index = self.game.tiles.index(*cell)
+        self.drop('d'+str(index))
+        self.dirty.add(index//SOFT_CHUNK)
+
+    def publish(self):
+        '''encodes what changed in the game this tick, once for every viewer,
+           and hands the frame to the server'''
+        start = perf_counter()
+        game = self.game
+        state = self.state
+        winner = game.winner.player_number if game.winner else 0
+        entries = [('g', [game.round_num, int(game.round_over), winner, int(game.time)])]
+        entries.extend(('p'+str(player.player_number), encode_player(player))
+                       for player in game.players)
+        entries.extend(('s'+str(chunk), encode_soft(game.tiles.grid, chunk))
+                       for chunk in self.dirty)
+        for key, value in entries:
+            if state.get(key) != value:
+                self.put(key, value)
+        keyframe = self.ticks % self.keyframe_every == 0
+        if keyframe:
+            frame = pack(KEYFRAME, game.tick, state)
+        else:
+            changed = {key: state[key] for key in self.touched if key in state}
+            removed = [key for key in self.touched if key not in state]
+            frame = pack(DELTA, game.tick, (changed, removed))
+        self.touched.clear()
+        self.dirty.clear()
+        self.ticks += 1
+        self.bytes_encoded += len(frame)
+        self.encode_time += perf_counter() - start
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.send, frame, keyframe)
+
+    def send(self, frame, keyframe):
+        '''queues a frame for every viewer with room for it'''
+        start = perf_counter()
+        for viewer in self.viewers:
+            if viewer.waiting and not keyframe:
+                viewer.frames_skipped += 1
+                continue
+            transport = viewer.writer.transport
+            if transport.get_write_buffer_size() > MAX_BUFFERED:
+                viewer.waiting = True
+                viewer.frames_skipped += 1
+                continue
+            viewer.waiting = False
+            viewer.writer.write(frame)
+            viewer.frames_sent += 1
+            viewer.bytes_sent += len(frame)
+        self.send_time += perf_counter() - start
+
+    async def on_viewer(self, reader, writer):
+        '''serves a viewer until it goes away'''
+        sock = writer.get_extra_info('socket')
+        if sock is not None:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SEND_BUFFER)
+        viewer = Viewer(writer)
+        writer.write(self.hello)
+        self.viewers.append(viewer)
+        try:
+            await reader.read() #viewers only ever hang up
+        except ConnectionError:
+            pass
+        finally:
+            self.viewers.remove(viewer)
+            writer.close()
+
+    async def serve(self, host, port):
+        '''starts the server, returns it'''
+        self.loop = asyncio.get_running_loop()
+        return await asyncio.start_server(self.on_viewer, host, port)
+
+    def start(self, host, port):
+        '''serves viewers on a background thread, for a program that is not
+           using asyncio such as the Tk game'''
+        ready = threading.Event()
+        def run():
+            async def serving():
+                server = await self.serve(host, port)
+                ready.set()
+                async with server:
+                    await server.serve_forever()
+            asyncio.run(serving())
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+
+    def report(self):
+        '''returns lines describing the cost of the broadcast'''
+        ticks = self.ticks or 1
+        lines = ['{} ticks, {:.3f} ms encoding and {:.3f} ms sending per tick, '
+                 '{:.2f} kB/s per viewer'.format(
+                     self.ticks, self.encode_time/ticks*1000,
+                     self.send_time/ticks*1000,
+                     self.bytes_encoded/(ticks*TICK/1000)/1000)]
+        for i, viewer in enumerate(self.viewers):
+            lines.append('  viewer {}: {} frames sent, {} skipped'.format(
+                i+1, viewer.frames_sent, viewer.frames_skipped))
+        return lines
+
+
+async def read_frames(reader, frames):
+    '''decodes the frames a broadcast sends into frames until it ends'''
+    try:
+        while True:
+            length, kind, tick = FRAME.unpack(await reader.readexactly(FRAME.size))
+            frames.append((kind, tick, json.loads(await reader.readexactly(length))))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+
+
+class MirrorGame(RemoteGame):
+    def __init__(self, hello, frames):
+        '''initialises a copy of a broadcast game that the Tk classes can
+           observe like a Game, frames being filled in from the network'''
+        self.frames = None
+        Game.__init__(self, hello['num_cols'], hello['num_rows'], hello['num_players'])
+        self.frames = frames
+        self.local = -1 #no player of our own
+        self.round_num = 0 #the first keyframe starts the round
+        self.tiles.reset()
+        self.state = {}
+        self.latest = None #newest state broadcast
+        self.pending = deque()
+        self.fire_keys = {}
+        self.frames_read = 0
+
+    def new_round(self):
+        '''rounds are started by the game being watched'''
+        if self.frames is None:
+            Game.new_round(self)
+
+    def step(self, inputs, dt=TICK):
+        '''shows the newest state broadcast'''
+        latest = self.latest
+        while self.frames:
+            kind, tick, message = self.frames.popleft()
+            self.frames_read += 1
+            if kind == KEYFRAME:
+                latest = message
+            elif kind == DELTA and latest is not None:
+                latest = patch(latest, *message)
+        if latest is not self.latest:
+            self.latest = latest
+            self.apply(latest)
+
+
+def watch(host, port, timeout=5):
+    '''connects to a broadcast from a program that is not using asyncio,
+       reading it on a background thread; returns a MirrorGame showing the
+       first keyframe'''
+    frames = deque()
+    ready = threading.Event()
+    result = {}
+    def run():
+        async def watching():
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as error:
+                result['error'] = error
+                ready.set()
+                return
+            ready.set()
+            await read_frames(reader, frames)
+        asyncio.run(watching())
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait(timeout)
+    if 'error' in result:
+        raise result['error']
+    waited = 0
+    while not frames and waited < timeout:
+        threading.Event().wait(TICK/1000)
+        waited += TICK/1000
+    if not frames or frames[0][0] != HELLO:
+        raise ConnectionError('no broadcast at {}:{}'.format(host, port))
+    game = MirrorGame(frames.popleft()[2], frames)
+    while game.latest is None and waited < timeout+KEYFRAME_EVERY*TICK/1000:
+        game.step(())
+        threading.Event().wait(TICK/1000)
+        waited += TICK/1000
+    return game
+
+
+async def demo(args):
+    '''broadcasts bots playing to local viewers, args.slow of which hardly
+       read, and reports what the broadcast cost'''
+    game = Game(args.cols, args.rows, len(args.bots), seed=args.seed)
+    bots = [load_bot(name)('{}-{}'.format(args.seed, i)) for i, name in enumerate(args.bots)]
+    broadcaster = Broadcaster(game)
+    broadcaster.attach()
+    server = await broadcaster.serve('127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+
+    watching = [] #frames read by each viewer keeping up
+    writers = []
+    async def viewer(slow):
+        sock = socket.socket()
+        if slow:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        sock.setblocking(False)
+        await asyncio.get_running_loop().sock_connect(sock, ('127.0.0.1', port))
+        reader, writer = await asyncio.open_connection(sock=sock,
+                                                       limit=1024 if slow else 2**16)
+        writers.append(writer)
+        if slow:
+            while True:
+                await asyncio.sleep(1)
+                await reader.read(512)
+        frames = deque()
+        watching.append(frames)
+        await read_frames(reader, frames)
+    tasks = [asyncio.ensure_future(viewer(i < args.slow)) for i in range(args.viewers)]
+    await asyncio.sleep(0.2)
+
+    loop = asyncio.get_running_loop()
+    end = loop.time() + args.seconds
+    next_time = loop.time()
+    while loop.time() < end:
+        if game.tick == 0:
+            for bot, player in zip(bots, game.players):
+                bot.reset(game, player)
+        if game.round_over:
+            game.new_round()
+        else:
+            game.step([bot.keys(game, player) for bot, player in zip(bots, game.players)])
+        next_time += TICK/1000
+        await asyncio.sleep(max(0, next_time - loop.time()))
+    await asyncio.sleep(0.2)
+    print('\n'.join(broadcaster.report()))
+    in_sync = 0
+    for frames in watching:
+        mirror = MirrorGame(frames.popleft()[2], frames)
+        mirror.step(())
+        in_sync += mirror.latest == broadcaster.state
+    print('{} of {} viewers keeping up show the last tick'.format(in_sync, len(watching)))
+    for writer in writers:
+        writer.close()
+    await asyncio.sleep(0.2)
+    for task in tasks:
+        task.cancel()
+    server.close()
+    await server.wait_closed()
+
+
+def main():
+    '''runs the demo from the command line'''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('mode', choices=('demo',))
+    parser.add_argument('--viewers', type=int, default=10)
+    parser.add_argument('--slow', type=int, default=1, help='viewers that hardly read')
+    parser.add_argument('--cols', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--bots', nargs='+', default=['smart', 'smart'])
+    parser.add_argument('--seconds', type=float, default=20, help='length of the demo')
+    args = parser.parse_args()
+    asyncio.run(demo(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+
+"""Checks of DynaBLASTER's binary formats and of the determinism they rely on:
+   snapshots, replays and map libraries read back into the same game.
+
+       python3 -m unittest test_formats
+"""
+
+from engine import Game
+from bots import load_bot
+from mapgen import MapLibrary
+from replay import Replay, Recorder, HEADER, EVENT, MAGIC
+
+import os
+import snapshot
+import tempfile
+import unittest
+
+MAX_TICKS = 20000 #a round of smart bots is over long before this
+
+
+def play(game, bots, ticks=MAX_TICKS):
+    '''plays game with bots for ticks or until the round ends, returns the
+       keys of every tick'''
+    inputs = []
+    for tick in range(ticks):
+        if game.round_over:
+            break
+        keys = [bot.keys(game, player) for bot, player in zip(bots, game.players)]
+        inputs.append(keys)
+        game.step(keys)
+    return inputs
+
+
+def smart_bots(game, seed=0):
+    '''returns a smart bot for every player of game'''
+    bots = [load_bot('smart')('{}-{}'.format(seed, i)) for i in range(len(game.players))]
+    for bot, player in zip(bots, game.players):
+        bot.reset(game, player)
+    return bots
+
+
+def outcome(game):
+    '''returns what a round came to'''
+    return (game.tick, game.round_over,
+            game.winner.player_number if game.winner else None,
+            [(player.x, player.y, player.dead, player.points) for player in game.players])
+
+
+class SnapshotTest(unittest.TestCase):
+    def test_restored_game_plays_on_the_same(self):
+        game = Game(7, 6, 2, seed=1)
+        bots = smart_bots(game)
+        play(game, bots, 400)
+        data = snapshot.save(game)
+        inputs = play(game, bots)
+        self.assertTrue(game.round_over)
+        restored = snapshot.load(data)
+        self.assertEqual(restored.tick, 400)
+        for keys in inputs:
+            restored.step(keys)
+        self.assertEqual(outcome(restored), outcome(game))
+        self.assertEqual(snapshot.save(restored), snapshot.save(game))
+
+    def test_layout_is_kept(self):
+        game = Game(7, 6, 2, seed=2)
+        game.maps = [game.soft_mask] #a round with every soft block there can be
+        game.new_round()
+        restored = snapshot.load(snapshot.save(game))
+        self.assertEqual(restored.layout, game.soft_mask)
+
+    def test_version_1_still_loads(self):
+        game = Game(7, 6, 2, seed=3)
+        play(game, smart_bots(game), 300)
+        data = snapshot.save(game)
+        header = snapshot.HEADER.size + snapshot.STATE_SIZE*4
+        size = len(game.tiles.grid)
+        old = (data[:4] + bytes([1]) + data[5:header+size] +
+               data[header+2*size:]) #without the layout
+        self.assertEqual(snapshot.save(snapshot.load(old))[header+2*size:],
+                         data[header+2*size:])
+
+
+class ReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'round{round}.dbr')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_replay_ends_the_same(self):
+        game = Game(7, 6, 2, seed=4)
+        Recorder(game, self.path)
+        play(game, smart_bots(game))
+        self.assertTrue(game.round_over)
+        replayed = Replay.load(self.path.format(round=1)).play()
+        self.assertEqual(outcome(replayed), outcome(game))
+
+    def test_map_library_round(self):
+        game = Game(7, 6, 2, seed=5)
+        game.maps = [game.soft_mask]
+        game.new_round()
+        Recorder(game, self.path)
+        play(game, smart_bots(game))
+        replayed = Replay.load(self.path.format(round=2)).play()
+        self.assertEqual(outcome(replayed), outcome(game))
+
+    def test_restored_round_is_not_recorded(self):
+        game = Game(7, 6, 2, seed=6)
+        play(game, smart_bots(game), 400)
+        restored = snapshot.load(snapshot.save(game))
+        recorder = Recorder(restored, self.path)
+        play(restored, smart_bots(restored))
+        self.assertIsNone(recorder.replay)
+        self.assertFalse(os.path.exists(self.path.format(round=1)))
+        restored.new_round()
+        play(restored, smart_bots(restored, 1))
+        replayed = Replay.load(self.path.format(round=2)).play()
+        self.assertEqual(outcome(replayed), outcome(restored))
+
+    def test_version_1_still_loads(self):
+        game = Game(7, 6, 2, seed=7)
+        recorder = Recorder(game)
+        play(game, smart_bots(game))
+        replay = recorder.replay
+        path = self.path.format(round=1)
+        with open(path, 'wb') as replay_file: #a header, the events and no layout
+            replay_file.write(HEADER.pack(
+                MAGIC, 1, replay.num_cols, replay.num_rows, replay.num_players,
+                replay.drop_chance, replay.seed, replay.round_num, replay.dt,
+                replay.ticks, len(replay.events)))
+            for event in replay.events:
+                replay_file.write(EVENT.pack(*event))
+        replayed = Replay.load(path).play()
+        self.assertEqual(outcome(replayed), outcome(game))
+
+
+class MapLibraryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.library = MapLibrary(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_built_maps_load(self):
+        layers, generator = self.library.build(7, 6, 2, count=10)
+        self.assertEqual(len(layers), 10)
+        self.assertEqual(self.library.load(7, 6, 2), layers)
+
+    def test_no_fair_maps(self):
+        with self.assertRaises(ValueError):
+            self.library.build(7, 6, 2, density=1.0, count=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""Compact tile map for DynaBLASTER.
+   The whole board, including a ring of hard blocks around it, is one flat
+   bytearray with a flag per layer in every cell, so asking whether a cell is
+   hard, soft, bombed or holds an item is a single indexed lookup.
+"""
+
+from array import array
+
+HARD_TILE = 1
+SOFT_TILE = 2
+BOMB_TILE = 4
+ITEM_TILE = 8
+SOLID = HARD_TILE | SOFT_TILE | BOMB_TILE #cells a player cannot walk into
+
+
+class TileMap(object):
+    def __init__(self, cols, rows):
+        '''initialises a map of cols x rows walkable cells with hard blocks
+           on every odd column and row and all around the edge'''
+        self.cols = cols
+        self.rows = rows
+        self.width = cols+2
+        self.height = rows+2
+        static = bytearray(self.width*self.height)
+        for row in range(-1, rows+1):
+            for col in range(-1, cols+1):
+                if col%2==1 and row%2==1 or \
+                   col==-1 or row==-1 or col==cols or row==rows:
+                    static[self.index(col, row)] = HARD_TILE
+        self.static = int.from_bytes(static, 'little')
+        self.grid = static
+        self.steps = (1, -1, self.width, -self.width) #right, left, down, up
+
+    def index(self, col, row):
+        '''returns the position of a cell in the grid'''
+        return (row+1)*self.width + col+1
+
+    def cell(self, index):
+        '''returns the column and row of a position in the grid'''
+        row, col = divmod(index, self.width)
+        return col-1, row-1
+
+    def get(self, col, row):
+        '''returns the flags of a cell'''
+        return self.grid[(row+1)*self.width + col+1]
+
+    def cells(self, flag):
+        '''returns every cell that has flag set'''
+        return [self.cell(i) for i, tile in enumerate(self.grid) if tile & flag]
+
+    def ray_lengths(self):
+        '''returns how many cells a ray starting on each cell can travel
+           right, left, down and up before it reaches a hard block,
+           laid out four to a cell'''
+        size = len(self.grid)
+        hard = self.static.to_bytes(size, 'little')
+        lengths = array('H', [0])*(4*size)
+        for ray, step in enumerate(self.steps):
+            #walk against the ray so the next cell along it is already known
+            order = range(size-1, -1, -1) if step > 0 else range(size)
+            for index in order:
+                after = index+step
+                if not hard[index] and not hard[after]:
+                    lengths[index*4+ray] = lengths[after*4+ray]+1
+        return lengths
+
+    def layer(self, flag, cells):
+        '''returns an int holding flag in the byte of each of cells,
+           ready to be combined with other layers in reset'''
+        grid = bytearray(len(self.grid))
+        for col, row in cells:
+            grid[self.index(col, row)] = flag
+        return int.from_bytes(grid, 'little')
+
+    def reset(self, layer=0):
+        '''clears every cell back to the hard blocks, adding layer on top'''
+        self.grid[:] = (self.static | layer).to_bytes(len(self.grid), 'little')
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+"""Headless bot-vs-bot tournaments for DynaBLASTER.
+   Plays best-of-M matches between bots across a pool of processes and
+   streams the result of every round to a CSV or JSONL file, e.g.
+
+       python3 tournament.py --matches 200 --best-of 5 --bots random random -o rounds.csv
+
+   Bots are given by name (see bots.BOTS) or as module:Class. With --record
+   every round is also saved as a replay (see replay.py), and with --maps DIR
+   every round is played on a vetted map from the library in DIR (see mapgen.py).
+"""
+
+from engine import Game, TICK, ITEM_DROP_CHANCE, SOFT_BLOCK_DENSITY
+from bots import load_bot
+from replay import Recorder
+from mapgen import MapLibrary
+from multiprocessing import Pool
+from time import perf_counter
+
+import argparse
+import csv
+import json
+import os
+import sys
+
+
+def play_round(game, bots, max_time):
+    '''plays one round to the end, or to max_time ms when nobody wins,
+       returns the seconds each bot spent deciding and its slowest tick'''
+    pairs = list(zip(bots, game.players))
+    for bot, player in pairs:
+        bot.reset(game, player)
+    spent = [0]*len(pairs)
+    slowest = [0]*len(pairs)
+    while not game.round_over and game.time < max_time:
+        inputs = []
+        for i, (bot, player) in enumerate(pairs):
+            start = perf_counter()
+            inputs.append(bot.keys(game, player))
+            elapsed = perf_counter() - start
+            spent[i] += elapsed
+            if elapsed > slowest[i]:
+                slowest[i] = elapsed
+        game.step(inputs, TICK)
+    return spent, slowest
+
+
+def play_match(task):
+    '''plays one match and returns a result for each of its rounds'''
+    match, seed, options = task
+    names = options['bots']
+    maps = None
+    if options['maps']:
+        maps = MapLibrary(options['maps']).load(options['cols'], options['rows'],
+                                                len(names), options['density'])
+    game = Game(options['cols'], options['rows'], len(names), seed=seed,
+                drop_chance=options['drop_chance'], maps=maps)
+    bots = [load_bot(name)('{}-{}'.format(seed, i)) for i, name in enumerate(names)]
+    wins_needed = options['best_of']//2+1
+    recorder = Recorder(game) if options['record'] else None
+    results = []
+    for round_num in range(1, options['max_rounds']+1):
+        spent, slowest = play_round(game, bots, options['max_time']*1000)
+        if recorder is not None:
+            recorder.save(os.path.join(options['record'],
+                          'match{}-round{}.dbr'.format(match, round_num)))
+        result = {'match': match, 'round': round_num, 'seed': seed,
+                  'winner': game.winner.player_number if game.winner else 0,
+                  'round_time': round(game.time/1000, 3),
+                  'timed_out': int(not game.round_over)}
+        for i, (name, player) in enumerate(zip(names, game.players)):
+            prefix = 'p'+str(player.player_number)+'_'
+            result[prefix+'bot'] = name
+            result[prefix+'decide_us'] = round(spent[i]/max(game.tick, 1)*1e6, 2)
+            result[prefix+'worst_decide_us'] = round(slowest[i]*1e6, 2)
+            result[prefix+'items'] = player.items_picked
+            result[prefix+'bombs'] = player.bombs_dropped
+            result[prefix+'points'] = player.points
+        results.append(result)
+        if max(player.points for player in game.players) >= wins_needed:
+            break
+        game.new_round()
+    return results
+
+
+def open_writer(path):
+    '''returns a function that writes a list of results to path as CSV or JSONL'''
+    output = sys.stdout if path == '-' else open(path, 'w', newline='')
+    if path.endswith('.csv'):
+        writer = []
+        def write(results):
+            if not writer:
+                writer.append(csv.DictWriter(output, fieldnames=list(results[0])))
+                writer[0].writeheader()
+            writer[0].writerows(results)
+            output.flush()
+    else:
+        def write(results):
+            for result in results:
+                output.write(json.dumps(result)+'\n')
+            output.flush()
+    return write
+
+
+def main():
+    '''runs a tournament from the command line'''
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--matches', type=int, default=100)
+    parser.add_argument('--best-of', type=int, default=3)
+    parser.add_argument('--max-rounds', type=int,
+                        help='rounds before a match is abandoned (default 3x best-of)')
+    parser.add_argument('--max-time', type=float, default=180,
+                        help='seconds of game time before a round is a draw')
+    parser.add_argument('--bots', nargs='+', default=['random', 'random'])
+    parser.add_argument('--cols', type=int, default=7)
+    parser.add_argument('--rows', type=int, default=6)
+    parser.add_argument('--drop-chance', type=int, default=ITEM_DROP_CHANCE,
+                        help='percent of soft blocks that leave an item')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int,
+                        help='worker processes (default one per core)')
+    parser.add_argument('-o', '--output', default='-',
+                        help='.csv for CSV, anything else for JSONL, - for stdout')
+    parser.add_argument('--record', metavar='DIR',
+                        help='save a replay of every round in DIR')
+    parser.add_argument('--maps', metavar='DIR',
+                        help='play on vetted maps from the library in DIR, '
+                             'building it first when it has none of this size')
+    parser.add_argument('--density', type=float, default=SOFT_BLOCK_DENSITY,
+                        help='soft block density of the maps from --maps')
+    args = parser.parse_args()
+    for name in args.bots:
+        load_bot(name)
+
+    options = {'bots': args.bots, 'cols': args.cols, 'rows': args.rows,
+               'best_of': args.best_of, 'max_time': args.max_time,
+               'max_rounds': args.max_rounds or args.best_of*3,
+               'drop_chance': args.drop_chance, 'record': args.record,
+               'maps': args.maps, 'density': args.density}
+    if args.maps:
+        MapLibrary(args.maps).maps(args.cols, args.rows, len(args.bots), args.density)
+    if args.record:
+        os.makedirs(args.record, exist_ok=True)
+    tasks = [(match, args.seed+match, options) for match in range(args.matches)]
+    write = open_writer(args.output)
+    start = perf_counter()
+    num_rounds = 0
+    match_wins = [0]*(len(args.bots)+1)
+    decide_us = [[] for name in args.bots]
+    worst_decide_us = [0]*len(args.bots)
+    pool = None
+    if args.processes == 1:
+        matches = map(play_match, tasks)
+    else:
+        pool = Pool(args.processes)
+        matches = pool.imap_unordered(play_match, tasks)
+    for results in matches:
+        write(results)
+        num_rounds += len(results)
+        for result in results:
+            for i in range(len(args.bots)):
+                prefix = 'p{}_'.format(i+1)
+                decide_us[i].append(result[prefix+'decide_us'])
+                worst_decide_us[i] = max(worst_decide_us[i], result[prefix+'worst_decide_us'])
+        last = results[-1]
+        points = [last['p{}_points'.format(i+1)] for i in range(len(args.bots))]
+        if points.count(max(points)) == 1:
+            match_wins[points.index(max(points))+1] += 1
+        else:
+            match_wins[0] += 1
+    elapsed = perf_counter() - start
+    if pool is not None:
+        pool.close()
+        pool.join()
+
+    print('{} matches, {} rounds in {:.2f}s ({:.1f} rounds/s)'.format(
+        args.matches, num_rounds, elapsed, num_rounds/elapsed), file=sys.stderr)
+    for i, name in enumerate(args.bots):
+        print('player {} ({}): {} matches won, {:.1f} us a tick deciding, '
+              '{:.1f} us at worst'.format(i+1, name, match_wins[i+1],
+                                          sum(decide_us[i])/len(decide_us[i]),
+                                          worst_decide_us[i]),
+              file=sys.stderr)
+    print('undecided: {}'.format(match_wins[0]), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Camera and viewport culling for DynaBLASTER.
+   The map can be far larger than the window. The camera follows the players
+   and only the cells inside the view, plus a margin, are given canvas items,
+   so what the board costs to draw depends on the size of the view and not on
+   the size of the map.
+
+   Positions are in cells, a cell's centre being at its col, row. The world
+   runs from -2 to cols+1 across: the map, its ring of hard blocks and half a
+   cell of border on either side.
+"""
+
+from math import floor, ceil
+
+MARGIN = 2 #cells materialised past each edge of the view
+
+
+class Viewport(object):
+    def __init__(self, cols, rows, view_cols, view_rows, margin=MARGIN):
+        '''initialises a view of view_cols x view_rows map cells onto a map of
+           cols x rows cells'''
+        self.cols = cols
+        self.rows = rows
+        self.width = min(view_cols, cols)+3
+        self.height = min(view_rows, rows)+3
+        self.margin = margin
+        self.left = -2
+        self.top = -2
+        self.area = (0, 0, -1, -1) #first col, first row, last col, last row
+
+    def follow(self, x, y):
+        '''centres the view on x, y as far as the edges of the world allow,
+           returns the top left corner of the view'''
+        self.left = min(max(x - self.width/2, -2), self.cols+1 - self.width)
+        self.top = min(max(y - self.height/2, -2), self.rows+1 - self.height)
+        return self.left, self.top
+
+    def visible(self):
+        '''returns the first and last col and row the view shows part of'''
+        return (max(floor(self.left-0.5)+1, -1), max(floor(self.top-0.5)+1, -1),
+                min(ceil(self.left+self.width+0.5)-1, self.cols),
+                min(ceil(self.top+self.height+0.5)-1, self.rows))
+
+    def contains(self, col, row):
+        '''returns whether a cell is materialised'''
+        return in_area(self.area, col, row)
+
+    def cells(self, area=None):
+        '''yields every cell in area, the materialised ones by default'''
+        first_col, first_row, last_col, last_row = area or self.area
+        for row in range(first_row, last_row+1):
+            for col in range(first_col, last_col+1):
+                yield col, row
+
+    def update(self):
+        '''materialises a new area once the view leaves the old one,
+           returns the cells that came into it and the ones that left it'''
+        first_col, first_row, last_col, last_row = self.visible()
+        old = self.area
+        if in_area(old, first_col, first_row) and in_area(old, last_col, last_row):
+            return (), ()
+        margin = self.margin
+        self.area = (max(first_col-margin, -1), max(first_row-margin, -1),
+                     min(last_col+margin, self.cols), min(last_row+margin, self.rows))
+        added = [cell for cell in self.cells() if not in_area(old, *cell)]
+        removed = [cell for cell in self.cells(old) if not self.contains(*cell)]
+        return added, removed
+
+
+def in_area(area, col, row):
+    '''returns whether a cell lies in an area of cells'''
+    return area[0] <= col <= area[2] and area[1] <= row <= area[3]